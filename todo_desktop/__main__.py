@@ -1,5 +1,7 @@
-from .app import main
+import sys
+
+from .cli import main
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -20,16 +20,30 @@ def _qt_msg_handler(mode, context, message):
 
 
 qInstallMessageHandler(_qt_msg_handler)
-from .models import init_db  # noqa: E402
+from .backup import BackupJob  # noqa: E402
+from .idle_maintenance import IdleMaintenance  # noqa: E402
 from .ui.main_window import MainWindow  # noqa: E402
+from .workspaces import DEFAULT_WORKSPACE, WorkspacePool  # noqa: E402
 
 
-def main():
+def main(backend=None):
     db_path = os.path.join(os.getcwd(), "todo_desktop.db")
-    init_db(db_path)
+    workspaces = WorkspacePool(os.getcwd(), default_path=db_path)
+    workspaces.activate(DEFAULT_WORKSPACE)
 
     app = QApplication(sys.argv)
 
+    # 定期在后台线程中对当前工作区做在线快照（保存在数据库旁的 backups/ 目录，保留最近几份）
+    backup_job = BackupJob(lambda: workspaces.active.engine, os.path.join(os.path.dirname(db_path), "backups"))
+    backup_job.start()
+    app.aboutToQuit.connect(backup_job.stop)
+
+    # 用户空闲时在后台线程中清理回收站中的旧任务、回收空闲页并更新查询统计信息
+    maintenance = IdleMaintenance(lambda: workspaces.active.engine)
+    maintenance.start()
+    app.aboutToQuit.connect(maintenance.stop)
+    app.aboutToQuit.connect(workspaces.close_all)
+
     # 使用系统默认的无衬线/通用界面字体（Qt 会返回平台推荐的 UI 字体）
     try:
         sys_font = QFontDatabase.systemFont(QFontDatabase.GeneralFont)
@@ -37,7 +51,7 @@ def main():
     except Exception:
         pass
 
-    w = MainWindow(db_path=db_path)
+    w = MainWindow(db_path=db_path, workspaces=workspaces, backend=backend)
     w.show()
     sys.exit(app.exec())
 
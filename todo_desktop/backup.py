@@ -0,0 +1,158 @@
+﻿"""Online database snapshots using the sqlite3 backup API (safe while the app is writing)."""
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+
+def _database_path(engine) -> Path:
+    return Path(engine.url.database)
+
+
+def backup_database(engine, dest_path, pages: int = 256, pause: float = 0.005) -> str:
+    """Copy the database behind `engine` to `dest_path` using the online backup API.
+
+    `pages` pages are copied per step and the thread sleeps `pause` seconds
+    between steps. Writes made by other connections meanwhile make SQLite
+    restart the copy, so the snapshot is always consistent.
+    """
+    dest_path = Path(dest_path)
+    tmp_path = dest_path.with_name(dest_path.name + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    def _progress(status, remaining, total):
+        if remaining and pause > 0:
+            time.sleep(pause)
+
+    raw = engine.raw_connection()
+    try:
+        dst = sqlite3.connect(str(tmp_path))
+        try:
+            raw.driver_connection.backup(dst, pages=pages, progress=_progress)
+        finally:
+            dst.close()
+    finally:
+        raw.close()
+    os.replace(tmp_path, dest_path)
+    return str(dest_path)
+
+
+def vacuum_into(engine, dest_path) -> str:
+    """Write a compacted, defragmented copy of the database with `VACUUM INTO`.
+
+    Unlike backup_database() this runs as a single statement, holding a read
+    transaction until the copy is complete.
+    """
+    dest_path = Path(dest_path)
+    tmp_path = dest_path.with_name(dest_path.name + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+    raw = engine.raw_connection()
+    try:
+        raw.driver_connection.execute("VACUUM INTO ?", (str(tmp_path),))
+    finally:
+        raw.close()
+    os.replace(tmp_path, dest_path)
+    return str(dest_path)
+
+
+def list_snapshots(engine, backup_dir) -> List[Path]:
+    """Snapshots of this database in `backup_dir`, oldest first."""
+    backup_dir = Path(backup_dir)
+    if not backup_dir.is_dir():
+        return []
+    # exact name pattern: workspace names may contain hyphens, so "work-*" would also
+    # match the snapshots of a workspace called "work-old"
+    pattern = re.compile(re.escape(_database_path(engine).stem) + r"-(\d{8}-\d{6})(?:-(\d+))?\.db")
+    found = []
+    for p in backup_dir.iterdir():
+        m = pattern.fullmatch(p.name)
+        if m:
+            found.append(((m.group(1), int(m.group(2) or 0)), p))
+    return [p for _, p in sorted(found)]
+
+
+def snapshot(engine, backup_dir, keep: int = 5, compact: bool = False, now: Optional[datetime] = None) -> str:
+    """Write a timestamped snapshot into `backup_dir` and keep only the newest `keep`."""
+    backup_dir = Path(backup_dir)
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    stamp = (now or datetime.now()).strftime("%Y%m%d-%H%M%S")
+    dest = backup_dir / f"{_database_path(engine).stem}-{stamp}.db"
+    n = 1
+    while dest.exists():
+        dest = backup_dir / f"{_database_path(engine).stem}-{stamp}-{n}.db"
+        n += 1
+    path = vacuum_into(engine, dest) if compact else backup_database(engine, dest)
+    if keep > 0:
+        for old in list_snapshots(engine, backup_dir)[:-keep]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+    return path
+
+
+class BackupJob:
+    """Takes a snapshot every `interval` seconds on a daemon thread.
+
+    The first one is taken `startup_delay` seconds after start() when the
+    newest existing snapshot is older than `interval` (or there is none), so
+    the app does not have to stay open for a whole interval to be backed up.
+    `engine` may also be a zero-argument callable returning the engine to back
+    up, e.g. the engine of whichever workspace is active.
+    """
+
+    def __init__(self, engine, backup_dir, interval: float = 6 * 60 * 60, keep: int = 5, compact: bool = False,
+                 startup_delay: float = 60):
+        self.engine = engine
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.startup_delay = startup_delay
+        self.keep = keep
+        self.compact = compact
+        self.last_path: Optional[str] = None
+        self.last_error: Optional[BaseException] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="todo-backup", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_now(self) -> Optional[str]:
+        try:
+            engine = self.engine() if callable(self.engine) else self.engine
+            self.last_path = snapshot(engine, self.backup_dir, keep=self.keep, compact=self.compact)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = e
+        return self.last_path
+
+    def _first_delay(self) -> float:
+        try:
+            engine = self.engine() if callable(self.engine) else self.engine
+            snaps = list_snapshots(engine, self.backup_dir)
+            age = time.time() - snaps[-1].stat().st_mtime if snaps else self.interval
+        except Exception:
+            age = self.interval
+        return max(self.startup_delay, self.interval - age)
+
+    def _run(self):
+        delay = self._first_delay()
+        while not self._stop.wait(delay):
+            self.run_now()
+            delay = self.interval
@@ -0,0 +1,102 @@
+"""Compare the storage backends on the operations the UI performs.
+
+    python -m todo_desktop.benchmarks --tasks 20000 --toggles 200
+
+Each backend gets a fresh database in a temporary directory (the memory
+store needs none). Times are wall-clock milliseconds.
+"""
+import argparse
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, List
+
+from . import repository
+from .models import create_db_engine, make_sessionmaker
+from .stores import BACKENDS, open_store
+
+
+def _ms(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+def bench_store(store, tasks: int, toggles: int, seed: int = 0, state=None) -> Dict[str, float]:
+    """`state` is the RepositoryState the store shares, if any; its notes cache
+    is cleared before the notes are timed so they are read from the database."""
+    rnd = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    results = {}
+
+    def insert():
+        for i in range(tasks):
+            due = now + timedelta(days=rnd.randint(-30, 60)) if i % 3 else None
+            store.add_task(f"Task {i}", notes=("note " * 20) if i % 5 == 0 else None,
+                           priority=rnd.randint(0, 10), due_date=due)
+
+    results["insert"] = _ms(insert)
+    results["list (cold)"] = _ms(lambda: store.list_tasks())
+    results["list (cached)"] = _ms(lambda: store.list_tasks())
+    ids = [t.id for t in store.list_tasks()]
+    sample = rnd.sample(ids, min(toggles, len(ids)))
+
+    def toggle_and_list():
+        # what clicking the status column does: write one row, then reload the list
+        for tid in sample:
+            store.set_done(tid, True)
+            store.list_tasks()
+
+    results[f"toggle+list x{len(sample)}"] = _ms(toggle_and_list)
+    # add_task() cached every note it wrote
+    if state is not None:
+        state.notes_cache.clear()
+    results[f"notes x{len(sample)}"] = _ms(lambda: [store.get_task_notes(tid) for tid in sample])
+    results["due next 7 days"] = _ms(lambda: store.list_due_between(now, now + timedelta(days=7)))
+    return results
+
+
+def run(tasks: int = 20000, toggles: int = 200, backends=BACKENDS) -> Dict[str, Dict[str, float]]:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in backends:
+            path = str(Path(tmp) / f"{backend}.db")
+            engine = None
+            state = None
+            if backend != "memory":
+                engine = create_db_engine(path)
+                state = repository.RepositoryState(make_sessionmaker(engine))
+            store = open_store(backend, path, state=state)
+            try:
+                results[backend] = bench_store(store, tasks, toggles, state=state)
+            finally:
+                store.close()
+                if engine is not None:
+                    engine.dispose()
+    return results
+
+
+def format_table(results: Dict[str, Dict[str, float]]) -> str:
+    backends = list(results)
+    ops: List[str] = list(next(iter(results.values()))) if results else []
+    width = max([len(op) for op in ops] + [10])
+    lines = [f"{'ms':<{width}}" + "".join(f"{b:>12}" for b in backends)]
+    for op in ops:
+        lines.append(f"{op:<{width}}" + "".join(f"{results[b][op]:>12.1f}" for b in backends))
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m todo_desktop.benchmarks", description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--toggles", type=int, default=200)
+    parser.add_argument("--backend", action="append", choices=BACKENDS, help="only these backends (repeatable)")
+    args = parser.parse_args(argv)
+    print(format_table(run(args.tasks, args.toggles, args.backend or BACKENDS)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
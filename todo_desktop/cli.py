@@ -0,0 +1,116 @@
+import argparse
+import os
+import sys
+
+
+def _default_db_path() -> str:
+    return os.path.join(os.getcwd(), "todo_desktop.db")
+
+
+def _cmd_backup(args) -> int:
+    from .backup import snapshot
+    from .models import init_db
+
+    engine = init_db(args.db)
+    backup_dir = args.dir or os.path.join(os.path.dirname(os.path.abspath(args.db)), "backups")
+    try:
+        path = snapshot(engine, backup_dir, keep=args.keep, compact=args.compact)
+    finally:
+        engine.dispose()
+    print(path)
+    return 0
+
+
+def _cmd_serve(args) -> int:
+    from .server import run_server
+
+    run_server(args.db, host=args.host, port=args.port)
+    return 0
+
+
+def _cmd_sync(args) -> int:
+    from . import repository
+    from .models import create_db_engine, make_sessionmaker
+    from .sync import SyncClient
+
+    engine = create_db_engine(args.db)
+    try:
+        state = repository.RepositoryState(make_sessionmaker(engine))
+        stats = SyncClient(args.server, state=state).sync()
+    finally:
+        engine.dispose()
+    print("pushed {pushed}, pulled {pulled} ({bytes_sent} bytes sent, {bytes_received} bytes received)".format(**stats))
+    return 0
+
+
+def _cmd_compress_notes(args) -> int:
+    from .maintenance import database_stats, measure_notes_read, recompress_notes
+    from .models import create_db_engine
+
+    # opening the engine only migrates the schema; notes are compressed below (or by the
+    # app's idle maintenance), so these "before" numbers are the uncompressed state
+    engine = create_db_engine(args.db)
+    try:
+        before = database_stats(engine)
+        before_ms = measure_notes_read(engine)
+        n = recompress_notes(engine, batch_size=args.batch)
+        if args.vacuum:
+            with engine.connect() as conn:
+                conn.exec_driver_sql("VACUUM")
+        after = database_stats(engine)
+        after_ms = measure_notes_read(engine)
+    finally:
+        engine.dispose()
+    print(f"compressed {n} notes")
+    print(f"file size   {before['file_bytes']:>12,} -> {after['file_bytes']:>12,} bytes")
+    print(f"in use      {before['used_bytes']:>12,} -> {after['used_bytes']:>12,} bytes")
+    print(f"read notes  {before_ms:>12.1f} -> {after_ms:>12.1f} ms ({after['tasks_with_notes']} tasks)")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m todo_desktop", description="Desktop TODO app")
+    parser.add_argument("--backend", choices=("sqlalchemy", "sqlite"), default=None,
+                        help="task storage used by the GUI (default: $TODO_BACKEND or sqlalchemy)")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("backup", help="write a snapshot of the database while it may be in use")
+    p.add_argument("--db", default=_default_db_path(), help="database file (default: ./todo_desktop.db)")
+    p.add_argument("--dir", default=None, help="snapshot directory (default: backups/ next to the database)")
+    p.add_argument("--keep", type=int, default=5, help="number of snapshots to keep (0 keeps all)")
+    p.add_argument("--compact", action="store_true", help="write a defragmented copy with VACUUM INTO")
+    p.set_defaults(func=_cmd_backup)
+
+    p = sub.add_parser("serve", help="serve the tasks over a local HTTP/JSON API")
+    p.add_argument("--db", default=_default_db_path(), help="database file (default: ./todo_desktop.db)")
+    p.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1; the API has no authentication)")
+    p.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    p.set_defaults(func=_cmd_serve)
+
+    p = sub.add_parser("sync", help="exchange changes with a todo_desktop serve instance")
+    p.add_argument("--db", default=_default_db_path(), help="database file (default: ./todo_desktop.db)")
+    p.add_argument("--server", required=True, help="server URL, e.g. http://192.168.1.10:8765")
+    p.set_defaults(func=_cmd_sync)
+
+    p = sub.add_parser("compress-notes", help="compress large notes and report size and read time")
+    p.add_argument("--db", default=_default_db_path(), help="database file (default: ./todo_desktop.db)")
+    p.add_argument("--batch", type=int, default=200, help="rows per transaction (default: 200)")
+    p.add_argument("--vacuum", action="store_true", help="rebuild the file afterwards to return freed pages")
+    p.set_defaults(func=_cmd_compress_notes)
+    return parser
+
+
+def main(argv=None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        from .stores import PERSISTENT_BACKENDS, default_backend
+
+        # --backend is limited by its choices, $TODO_BACKEND is not
+        if (args.backend or default_backend()) not in PERSISTENT_BACKENDS:
+            parser.error(f"TODO_BACKEND must be one of {', '.join(PERSISTENT_BACKENDS)} for the GUI")
+        # no subcommand: start the GUI (imported lazily so CLI commands do not need Qt)
+        from .app import main as gui_main
+        return gui_main(backend=args.backend)
+    return args.func(args)
@@ -0,0 +1,98 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from PySide6.QtCore import QEvent, QObject, QTimer, Signal
+from PySide6.QtWidgets import QApplication
+
+from .maintenance import run_maintenance
+
+# events that mean the user is doing something
+_INPUT_EVENTS = frozenset({
+    QEvent.KeyPress, QEvent.MouseButtonPress, QEvent.MouseButtonDblClick, QEvent.Wheel, QEvent.MouseMove,
+})
+
+
+class IdleMaintenance(QObject):
+    """Runs maintenance.run_maintenance() once the user has been idle for a while.
+
+    A timer checks every `check_ms` whether there was no input for `idle_secs`
+    and the last complete run is older than `interval`. The work itself runs on
+    a worker thread, so the GUI never waits for it. Any input while it runs
+    makes it stop after the current batch; it is retried at the next idle
+    period. `engine` may be a zero-argument callable returning the engine, e.g.
+    the engine of whichever workspace is active.
+    """
+
+    finished = Signal(dict)
+
+    def __init__(self, engine, idle_secs: float = 120, interval: float = 24 * 3600, check_ms: int = 30_000,
+                 purge_after: float = 7 * 24 * 3600, clock: Callable[[], float] = time.monotonic, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.idle_secs = idle_secs
+        self.interval = interval
+        self.purge_after = purge_after
+        self._clock = clock
+        self._last_input = clock()
+        self._last_run: Optional[float] = None
+        self.last_result: Optional[dict] = None
+        self.last_error: Optional[BaseException] = None
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(check_ms)
+        self._timer.timeout.connect(self.check)
+
+    def start(self):
+        app = QApplication.instance()
+        if app is not None:
+            app.installEventFilter(self)
+        self._timer.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._timer.stop()
+        app = QApplication.instance()
+        if app is not None:
+            app.removeEventFilter(self)
+        self._cancel.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def eventFilter(self, obj, event):
+        # called for every event in the application: keep this cheap
+        if event.type() in _INPUT_EVENTS:
+            self._last_input = self._clock()
+            if self._thread is not None:
+                self._cancel.set()
+        return False
+
+    def check(self) -> bool:
+        """Start a run if the user is idle and one is due; returns whether it started."""
+        now = self._clock()
+        if self.is_running() or now - self._last_input < self.idle_secs:
+            return False
+        if self._last_run is not None and now - self._last_run < self.interval:
+            return False
+        self._cancel.clear()
+        engine = self.engine() if callable(self.engine) else self.engine
+        self._thread = threading.Thread(target=self._run, args=(engine,), name="todo-maintenance", daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self, engine):
+        try:
+            result = run_maintenance(engine, self.purge_after, should_continue=lambda: not self._cancel.is_set())
+        except Exception as e:
+            self.last_error = e
+            return
+        self.last_error = None
+        self.last_result = result
+        if result["complete"]:
+            self._last_run = self._clock()
+        # queued to the GUI thread
+        self.finished.emit(result)
@@ -0,0 +1,143 @@
+"""Database housekeeping that is not needed on every start (see also idle_maintenance)."""
+import os
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import select
+
+from .models import Task, _recompress_notes
+
+
+def database_stats(engine) -> dict:
+    """File size, bytes in use (excluding free pages) and number of tasks with notes."""
+    with engine.connect() as conn:
+        page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+        pages = conn.exec_driver_sql("PRAGMA page_count").scalar()
+        free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        with_notes = conn.exec_driver_sql("SELECT count(*) FROM tasks WHERE has_notes").scalar()
+    path = engine.url.database
+    return {
+        "file_bytes": os.path.getsize(path) if path and os.path.exists(path) else pages * page_size,
+        "used_bytes": (pages - free) * page_size,
+        "tasks_with_notes": with_notes,
+    }
+
+
+def measure_notes_read(engine, limit: Optional[int] = None) -> float:
+    """Milliseconds to load (and decompress) the notes of up to `limit` tasks, as the tooltip would."""
+    q = select(Task.notes).where(Task.has_notes.is_(True)).order_by(Task.id)
+    if limit:
+        q = q.limit(limit)
+    with engine.connect() as conn:
+        t0 = time.perf_counter()
+        for _ in conn.execute(q):
+            pass
+        return (time.perf_counter() - t0) * 1000
+
+
+def recompress_notes(engine, batch_size: int = 200, pause: float = 0.0,
+                     should_continue: Optional[Callable[[], bool]] = None) -> int:
+    """Compress existing large notes, one short transaction per batch. Returns rows rewritten.
+
+    New and edited notes are compressed when written. Notes stored by older
+    versions (or before NOTES_COMPRESS_THRESHOLD was lowered) are converted
+    by this, without holding the write lock for the whole table; it stops
+    early when `should_continue()` returns False and picks up the rest next time.
+    """
+    last_id = 0
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            last_id, n = _recompress_notes(conn, last_id, batch_size)
+        total += n
+        if not last_id:
+            return total
+        if should_continue is not None and not should_continue():
+            return total
+        if pause > 0:
+            time.sleep(pause)
+
+
+def purge_deleted(engine, older_than: float = 7 * 24 * 3600, batch_size: int = 500,
+                  should_continue: Optional[Callable[[], bool]] = None) -> int:
+    """Permanently remove tasks that have been in the trash for more than `older_than` seconds.
+
+    Works in batches, one short write transaction each, and stops early when
+    `should_continue()` returns False. Returns the number of tasks removed.
+    """
+    cutoff = int(time.time() - older_than)
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            ids = tuple(r[0] for r in conn.exec_driver_sql(
+                "SELECT id FROM tasks WHERE deleted_at IS NOT NULL AND deleted_at < ? ORDER BY deleted_at LIMIT ?",
+                (cutoff, batch_size),
+            ))
+            if not ids:
+                return total
+            marks = ", ".join("?" * len(ids))
+            conn.exec_driver_sql(f"DELETE FROM task_tags WHERE task_id IN ({marks})", ids)
+            conn.exec_driver_sql(f"DELETE FROM tasks WHERE id IN ({marks})", ids)
+        total += len(ids)
+        if should_continue is not None and not should_continue():
+            return total
+
+
+def incremental_vacuum(engine, max_pages: Optional[int] = None) -> int:
+    """Return free pages to the file system; a no-op unless auto_vacuum is INCREMENTAL.
+
+    Databases created by this version use INCREMENTAL mode. Older files keep
+    their mode (switching needs a full VACUUM), for them this returns 0.
+    """
+    raw = engine.raw_connection()
+    try:
+        con = raw.driver_connection
+        if con.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+        before = con.execute("PRAGMA freelist_count").fetchone()[0]
+        # each step of the statement frees one page, so it has to be run to completion
+        con.execute(f"PRAGMA incremental_vacuum({int(max_pages or 0)})").fetchall()
+        return before - con.execute("PRAGMA freelist_count").fetchone()[0]
+    finally:
+        raw.close()
+
+
+def optimize(engine) -> str:
+    """Refresh the query planner statistics: a full ANALYZE the first time, then PRAGMA optimize.
+
+    PRAGMA optimize only re-analyzes tables whose size changed considerably,
+    so it is cheap enough to run regularly.
+    """
+    raw = engine.raw_connection()
+    try:
+        con = raw.driver_connection
+        analyzed = con.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+        statement = "PRAGMA optimize" if analyzed else "ANALYZE"
+        con.execute(statement).fetchall()
+        con.commit()
+        return statement
+    finally:
+        raw.close()
+
+
+def run_maintenance(engine, purge_after: float = 7 * 24 * 3600,
+                    should_continue: Optional[Callable[[], bool]] = None) -> dict:
+    """Compress old notes, purge old tombstones, give freed pages back and refresh planner statistics.
+
+    `should_continue()` is checked between batches and steps; `complete` in
+    the result is False when the run stopped early.
+    """
+    keep_going = should_continue or (lambda: True)
+    result = {"compressed": 0, "purged": 0, "freed_pages": 0, "optimized": None, "complete": False}
+    result["compressed"] = recompress_notes(engine, should_continue=keep_going)
+    if not keep_going():
+        return result
+    result["purged"] = purge_deleted(engine, purge_after, should_continue=keep_going)
+    if not keep_going():
+        return result
+    result["freed_pages"] = incremental_vacuum(engine)
+    if not keep_going():
+        return result
+    result["optimized"] = optimize(engine)
+    result["complete"] = True
+    return result
@@ -1,26 +1,338 @@
-﻿from datetime import datetime, timezone
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text
-from sqlalchemy.orm import declarative_base, sessionmaker
+﻿import hashlib
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+from sqlalchemy import create_engine, inspect, literal_column, Column, ForeignKey, Index, Integer, String, Boolean, Table, Text
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.orm import declarative_base, sessionmaker, deferred, relationship, validates
 
 Base = declarative_base()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
 
+def to_epoch(value):
+    """Epoch seconds for a datetime (naive = local time) or number; None stays None."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    return int(value.timestamp())
+
+
+def from_epoch(value):
+    """Aware local datetime for stored epoch seconds; None stays None."""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc).astimezone()
+
+
+class EpochDateTime(TypeDecorator):
+    """Datetime stored as integer seconds since the Unix epoch.
+
+    Naive values are taken to be local time (that is what the date picker
+    produces). Values are always returned as timezone-aware local datetimes,
+    so comparisons and ORDER BY work on plain integers.
+    """
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return to_epoch(value)
+
+    def process_result_value(self, value, dialect):
+        return from_epoch(value)
+
+
+# Notes of at least this many UTF-8 bytes are stored compressed. Smaller ones stay
+# plain text: they would barely shrink and are read far more often (tooltips).
+NOTES_COMPRESS_THRESHOLD = 4096
+# prefix of compressed notes: format "Z", version 1 (zlib stream follows)
+_ZLIB_MARKER = b"Z1"
+
+
+def compress_notes(value: Optional[str], threshold: int = NOTES_COMPRESS_THRESHOLD):
+    """Storage form of a notes value: the text itself, or marker + zlib data as bytes.
+
+    Plain notes are stored as TEXT and compressed ones as a BLOB, so the two
+    can never be confused when reading.
+    """
+    if value is None:
+        return None
+    raw = value.encode("utf-8")
+    if len(raw) < threshold:
+        return value
+    packed = _ZLIB_MARKER + zlib.compress(raw, 6)
+    return packed if len(packed) < len(raw) else value
+
+
+def decompress_notes(value) -> Optional[str]:
+    """Inverse of compress_notes(); text values are returned unchanged."""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    if value.startswith(_ZLIB_MARKER):
+        return zlib.decompress(value[len(_ZLIB_MARKER):]).decode("utf-8")
+    return value.decode("utf-8", errors="replace")
+
+
+class CompressedText(TypeDecorator):
+    """Text column whose large values are stored zlib-compressed (see compress_notes).
+
+    Decompression happens when the value is loaded, and `Task.notes` is a
+    deferred column, so only the tooltip / edit dialog ever pay for it.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return compress_notes(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_notes(value)
+
+
+# many-to-many link between tasks and tags; the primary key covers "tags of a task",
+# the second index covers "tasks with a tag" (filtering and per-tag counts)
+task_tags = Table(
+    "task_tags",
+    Base.metadata,
+    Column("task_id", Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True),
+    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_task_tags_tag_id_task_id", "tag_id", "task_id"),
+)
+
+
+class Tag(Base):
+    __tablename__ = "tags"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+
 class Task(Base):
     __tablename__ = "tasks"
+    # serves the due-date views (overdue / today / next N days), which only list pending tasks
+    __table_args__ = (
+        Index("ix_tasks_done_due_date", "done", "due_date"),
+        # only tombstones are indexed; used by the purge in maintenance.purge_deleted()
+        Index("ix_tasks_deleted_at", "deleted_at", sqlite_where=literal_column("deleted_at").isnot(None)),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
-    notes = Column(Text)
+    # notes can be arbitrarily large and are only needed by the tooltip / edit dialog,
+    # so they are not loaded with the row; `has_notes` is kept in sync for rendering
+    notes = deferred(Column(CompressedText))
+    has_notes = Column(Boolean, default=False, nullable=False)
     done = Column(Boolean, default=False, nullable=False)
     priority = Column(Integer, default=0)
-    due_date = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
-    updated_at = Column(DateTime, nullable=True)
+    due_date = Column(EpochDateTime, nullable=True)
+    created_at = Column(EpochDateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(EpochDateTime, nullable=True)
+    # set instead of deleting the row, so a delete is one UPDATE and can be undone;
+    # tombstones are removed for good by the maintenance job after a grace period
+    deleted_at = Column(EpochDateTime, nullable=True)
+    # stable identity across databases, used by sync (integer ids differ per device)
+    uid = Column(String(32), unique=True, index=True, default=lambda: uuid.uuid4().hex)
+    tags = relationship(Tag, secondary=task_tags, order_by=Tag.name)
 
+    @validates("notes")
+    def _sync_has_notes(self, key, value):
+        self.has_notes = bool(value)
+        return value
 
-def init_db(db_path: str = "todo_desktop.db"):
+
+class ChangeLog(Base):
+    """One row per change to a task, filled by triggers (see _CHANGE_LOG_TRIGGERS).
+
+    `seq` only ever grows (AUTOINCREMENT never reuses values), so "all changes
+    since cursor N" is a range scan on the primary key.
+    """
+
+    __tablename__ = "change_log"
+    __table_args__ = {"sqlite_autoincrement": True}
+    seq = Column(Integer, primary_key=True)
+    uid = Column(String(32), nullable=False)
+    op = Column(String(8), nullable=False)  # "upsert" or "delete"
+    changed_at = Column(Integer, nullable=False)  # epoch seconds
+
+
+class SyncState(Base):
+    """Small key/value store for sync cursors (and the reminders' delivery mark)."""
+
+    __tablename__ = "sync_state"
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=True)
+
+
+_NOW_EPOCH = "CAST(strftime('%s', 'now') AS INTEGER)"
+_CHANGE_LOG_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_tasks_log_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO change_log (uid, op, changed_at) VALUES (NEW.uid, 'upsert', {_NOW_EPOCH});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_tasks_log_update AFTER UPDATE ON tasks BEGIN
+        INSERT INTO change_log (uid, op, changed_at) VALUES (NEW.uid, 'upsert', {_NOW_EPOCH});
+    END""",
+    # purging a task from the trash logs the time it was deleted, not the time of the purge:
+    # a restore made on another device after the delete must still win against it
+    f"""CREATE TRIGGER IF NOT EXISTS trg_tasks_log_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO change_log (uid, op, changed_at) VALUES (OLD.uid, 'delete', coalesce(OLD.deleted_at, {_NOW_EPOCH}));
+    END""",
+    # tag changes are logged as an upsert of the task they belong to
+    f"""CREATE TRIGGER IF NOT EXISTS trg_task_tags_log_insert AFTER INSERT ON task_tags BEGIN
+        INSERT INTO change_log (uid, op, changed_at) SELECT uid, 'upsert', {_NOW_EPOCH} FROM tasks WHERE id = NEW.task_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_task_tags_log_delete AFTER DELETE ON task_tags BEGIN
+        INSERT INTO change_log (uid, op, changed_at) SELECT uid, 'upsert', {_NOW_EPOCH} FROM tasks WHERE id = OLD.task_id;
+    END""",
+]
+
+
+def _column_names(conn, table: str):
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def _migrate_has_notes(conn):
+    if "has_notes" not in _column_names(conn, "tasks"):
+        conn.exec_driver_sql("ALTER TABLE tasks ADD COLUMN has_notes BOOLEAN NOT NULL DEFAULT 0")
+    conn.exec_driver_sql("UPDATE tasks SET has_notes = (notes IS NOT NULL AND notes != '')")
+
+
+def _migrate_epoch_timestamps(conn):
+    # older versions stored DateTime columns as ISO strings: created_at/updated_at
+    # were written in UTC, due_date as a naive local date from the dialog
+    for column, naive_tz in (("created_at", timezone.utc), ("updated_at", timezone.utc), ("due_date", None)):
+        rows = conn.exec_driver_sql(f"SELECT id, {column} FROM tasks WHERE typeof({column}) = 'text'").fetchall()
+        params = []
+        for task_id, text in rows:
+            try:
+                dt = datetime.fromisoformat(text)
+            except ValueError:
+                params.append((None, task_id))
+                continue
+            if dt.tzinfo is None and naive_tz is not None:
+                dt = dt.replace(tzinfo=naive_tz)
+            params.append((int(dt.timestamp()), task_id))
+        if params:
+            conn.exec_driver_sql(f"UPDATE tasks SET {column} = ? WHERE id = ?", params)
+
+
+def _migrate_due_date_index(conn):
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_tasks_done_due_date ON tasks (done, due_date)")
+
+
+def _migrate_sync_uid(conn):
+    if "uid" not in _column_names(conn, "tasks"):
+        conn.exec_driver_sql("ALTER TABLE tasks ADD COLUMN uid VARCHAR(32)")
+    # derived from the row rather than random: copies of the same old database file
+    # (e.g. carried between laptop and desktop) must give their tasks the same uids,
+    # or the first sync would duplicate every task. id + created_at stays the same
+    # when a task was edited on one copy; the title only stands in for a missing created_at.
+    rows = conn.exec_driver_sql("SELECT id, created_at, title FROM tasks WHERE uid IS NULL").fetchall()
+    params = []
+    for task_id, created_at, title in rows:
+        identity = f"{task_id}:{created_at}" if created_at is not None else f"{task_id}::{title}"
+        params.append((hashlib.md5(identity.encode("utf-8")).hexdigest(), task_id))
+    if params:
+        conn.exec_driver_sql("UPDATE tasks SET uid = ? WHERE id = ?", params)
+    conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS ix_tasks_uid ON tasks (uid)")
+    # existing tasks predate the change log: record them so the first sync sends them
+    conn.exec_driver_sql(
+        f"INSERT INTO change_log (uid, op, changed_at) SELECT uid, 'upsert', {_NOW_EPOCH} FROM tasks ORDER BY id"
+    )
+
+
+def _migrate_soft_delete(conn):
+    if "deleted_at" not in _column_names(conn, "tasks"):
+        conn.exec_driver_sql("ALTER TABLE tasks ADD COLUMN deleted_at INTEGER")
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_tasks_deleted_at ON tasks (deleted_at) WHERE deleted_at IS NOT NULL"
+    )
+
+
+def _migrate_delete_log_time(conn):
+    # recreated with the new body by _run_migrations
+    conn.exec_driver_sql("DROP TRIGGER IF EXISTS trg_tasks_log_delete")
+
+
+def _recompress_notes(conn, after_id: int = 0, batch_size: int = 200) -> Tuple[int, int]:
+    """Compress one batch of plain-text notes above the threshold, starting after task `after_id`.
+
+    Returns (last task id scanned, rows rewritten); the last id is 0 when
+    there is nothing left. The writes do not change any task, so the entries
+    they add to the change log are removed again (sync would resend them).
+    """
+    rows = conn.exec_driver_sql(
+        "SELECT id, notes FROM tasks WHERE id > ? AND typeof(notes) = 'text' AND length(CAST(notes AS BLOB)) >= ? "
+        "ORDER BY id LIMIT ?",
+        (after_id, NOTES_COMPRESS_THRESHOLD, batch_size),
+    ).fetchall()
+    if not rows:
+        return 0, 0
+    params = []
+    for task_id, text in rows:
+        packed = compress_notes(text)
+        if isinstance(packed, bytes):
+            params.append((packed, task_id))
+    if params:
+        # write first so this transaction holds SQLite's write lock (a DELETE that matches
+        # nothing still takes it): no other connection can then log a change between
+        # reading `log_seq` and the DELETE below, which would drop that change
+        conn.exec_driver_sql("DELETE FROM change_log WHERE seq < 0")
+        log_seq = conn.exec_driver_sql("SELECT coalesce(max(seq), 0) FROM change_log").scalar()
+        conn.exec_driver_sql("UPDATE tasks SET notes = ? WHERE id = ?", params)
+        conn.exec_driver_sql("DELETE FROM change_log WHERE seq > ?", (log_seq,))
+    return rows[-1][0], len(params)
+
+
+# Schema migrations for databases created by older versions, applied in order.
+# The number of applied steps is stored in SQLite's `PRAGMA user_version`.
+_MIGRATIONS = [
+    _migrate_has_notes,
+    _migrate_epoch_timestamps,
+    _migrate_due_date_index,
+    _migrate_sync_uid,
+    _migrate_soft_delete,
+    _migrate_delete_log_time,
+]
+
+
+def _run_migrations(engine, fresh: bool):
+    with engine.begin() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+        if not fresh:
+            for step in _MIGRATIONS[version:]:
+                step(conn)
+        if version != len(_MIGRATIONS):
+            conn.exec_driver_sql(f"PRAGMA user_version = {len(_MIGRATIONS)}")
+        for ddl in _CHANGE_LOG_TRIGGERS:
+            conn.exec_driver_sql(ddl)
+
+
+def create_db_engine(db_path: str):
+    """Create an engine for `db_path`, creating or migrating the schema as needed."""
     engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
-    SessionLocal.configure(bind=engine)
+    with engine.connect() as conn:
+        fresh = not inspect(conn).has_table("tasks")
+        if fresh:
+            # only possible before the first table exists; lets maintenance return
+            # freed pages to the OS with PRAGMA incremental_vacuum instead of a full VACUUM
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            Base.metadata.create_all(bind=conn)
+            conn.commit()
     Base.metadata.create_all(bind=engine)
+    _run_migrations(engine, fresh)
+    return engine
+
+
+def make_sessionmaker(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def init_db(db_path: str = "todo_desktop.db"):
+    engine = create_db_engine(db_path)
+    SessionLocal.configure(bind=engine)
     return engine
@@ -0,0 +1,196 @@
+import heapq
+import math
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from . import repository, sync
+
+# sync_state key holding the time up to which reminders have been delivered
+REMINDED_UNTIL_KEY = "reminders_until"
+
+
+class ReminderQueue:
+    """Min-heap of upcoming due times.
+
+    Entries are (due timestamp, task id). Rescheduling or removing a task does
+    not search the heap: `_due` holds the current due time per task, and heap
+    entries that no longer match it are dropped when they reach the top.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int]] = []
+        self._due: Dict[int, Tuple[float, str]] = {}
+
+    def __len__(self):
+        return len(self._due)
+
+    def load(self, items: Iterable[Tuple[int, float, str]]):
+        """Replace the contents with (task_id, due timestamp, title) items."""
+        self._due = {tid: (ts, title) for tid, ts, title in items}
+        self._heap = [(ts, tid) for tid, (ts, _) in self._due.items()]
+        heapq.heapify(self._heap)
+
+    def set(self, task_id: int, due_ts: float, title: str = ""):
+        current = self._due.get(task_id)
+        self._due[task_id] = (due_ts, title)
+        if current is None or current[0] != due_ts:
+            heapq.heappush(self._heap, (due_ts, task_id))
+            self._compact()
+
+    def discard(self, task_id: int):
+        self._due.pop(task_id, None)
+
+    def peek(self) -> Optional[float]:
+        """Earliest due timestamp, or None when nothing is scheduled."""
+        heap = self._heap
+        while heap:
+            ts, tid = heap[0]
+            entry = self._due.get(tid)
+            if entry is not None and entry[0] == ts:
+                return ts
+            heapq.heappop(heap)
+        return None
+
+    def pop_due(self, now: float) -> List[Tuple[int, str, float]]:
+        """Remove and return (task_id, title, due timestamp) for everything due at or before `now`."""
+        fired = []
+        while True:
+            ts = self.peek()
+            if ts is None or ts > now:
+                return fired
+            _, tid = heapq.heappop(self._heap)
+            _, title = self._due.pop(tid)
+            fired.append((tid, title, ts))
+
+    def _compact(self):
+        # stale entries are normally dropped lazily; rebuild if they dominate the heap
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._heap = [(ts, tid) for tid, (ts, _) in self._due.items()]
+            heapq.heapify(self._heap)
+
+
+class ReminderScheduler(QObject):
+    """Emits `reminder_due(task_id, title)` when a pending task reaches its due time.
+
+    A single-shot QTimer is armed for the earliest deadline only. The queue is
+    loaded once from an indexed query and then kept up to date from repository
+    change notifications, so no periodic scan over all tasks is needed.
+
+    Due dates picked in the dialog are local midnight, which has usually passed
+    when the app starts. So loading starts at the beginning of today (or at the
+    last delivered reminder, if later): tasks due earlier today that were not
+    reminded yet fire right away. The delivery time is kept in the database so a
+    restart does not repeat them.
+    """
+
+    reminder_due = Signal(int, str)
+
+    # re-check at least this often so a suspended machine or a changed system clock
+    # cannot delay a reminder by more than this
+    MAX_INTERVAL_MS = 60 * 60 * 1000
+
+    def __init__(self, clock: Callable[[], float] = time.time, parent=None):
+        super().__init__(parent)
+        self._clock = clock
+        self.queue = ReminderQueue()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._on_timeout)
+        self._started = False
+        # time up to which reminders were delivered (kept in the database, see REMINDED_UNTIL_KEY)
+        self._until: Optional[float] = None
+        # due times of the tasks due from today on, to tell a changed due date from other edits
+        self._known_due: Dict[int, float] = {}
+
+    def start(self):
+        if not self._started:
+            repository.add_listener(self._on_task_changed)
+            self._started = True
+        self.reload()
+
+    def stop(self):
+        repository.remove_listener(self._on_task_changed)
+        self._started = False
+        self._timer.stop()
+
+    def reload(self):
+        """Rebuild the queue from the database (e.g. after switching databases)."""
+        self._until = self._reminded_until()
+        rows = repository.list_upcoming_due(after=datetime.fromtimestamp(self._today(), timezone.utc))
+        self._known_due = {tid: due.timestamp() for tid, _, due in rows}
+        since = self._since()
+        self.queue.load((tid, due.timestamp(), title) for tid, title, due in rows if due.timestamp() >= since)
+        self._arm()
+
+    def _today(self) -> float:
+        return repository.start_of_day(datetime.fromtimestamp(self._clock(), timezone.utc)).timestamp()
+
+    def _since(self) -> float:
+        """Earliest due time still to be reminded: start of today, or after the last delivery."""
+        since = self._today()
+        if self._until is not None and self._until >= since:
+            # due times are whole seconds; everything up to `_until` has been delivered
+            since = math.floor(self._until) + 1
+        return since
+
+    def next_interval_ms(self) -> Optional[int]:
+        """Interval the timer is armed with, or None when idle."""
+        return self._timer.interval() if self._timer.isActive() else None
+
+    def _on_task_changed(self, op: str, task_id: int, values: Optional[dict]):
+        due = values.get("due_date") if values else None
+        if op == "delete" or due is None:
+            self._known_due.pop(task_id, None)
+            self.queue.discard(task_id)
+        elif values.get("done"):
+            self.queue.discard(task_id)
+        else:
+            ts = due.timestamp()
+            # a new due time (e.g. "today" from the dialog, which is local midnight) is reminded
+            # even if it has passed; otherwise only what has not been reminded yet. Editing a task
+            # that is overdue since before today must not re-fire its reminder.
+            new_due = self._known_due.get(task_id) != ts
+            from_today = ts >= self._today()
+            if from_today:
+                self._known_due[task_id] = ts
+            if from_today and (new_due or ts >= self._since()):
+                self.queue.set(task_id, ts, values.get("title") or "")
+            else:
+                self.queue.discard(task_id)
+        self._arm()
+
+    def _on_timeout(self):
+        now = self._clock()
+        fired = self.queue.pop_due(now)
+        if fired:
+            self._until = now
+            self._set_reminded_until(now)
+        for tid, title, _ in fired:
+            self.reminder_due.emit(tid, title)
+        self._arm()
+
+    @staticmethod
+    def _reminded_until() -> Optional[float]:
+        try:
+            value = sync.get_sync_value(REMINDED_UNTIL_KEY)
+            return float(value) if value is not None else None
+        except Exception:
+            return None
+
+    @staticmethod
+    def _set_reminded_until(ts: float):
+        try:
+            sync.set_sync_value(REMINDED_UNTIL_KEY, repr(ts))
+        except Exception:
+            pass
+
+    def _arm(self):
+        ts = self.queue.peek()
+        if ts is None:
+            self._timer.stop()
+            return
+        delay_ms = max(0, math.ceil((ts - self._clock()) * 1000))
+        self._timer.start(min(delay_ms, self.MAX_INTERVAL_MS))
@@ -1,90 +1,371 @@
-﻿from datetime import datetime, timezone
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from .models import Task, SessionLocal
+﻿from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session, undefer
+from .models import Tag, Task, SessionLocal, task_tags
+
+class _NotesCache:
+    """LRU cache of task notes keyed by task id, bounded by the total number of
+    cached characters rather than the number of entries (a single pasted log can
+    be larger than hundreds of short notes)."""
+
+    def __init__(self, max_chars: int = 2_000_000):
+        self.max_chars = max_chars
+        self._entries: "OrderedDict[int, Optional[str]]" = OrderedDict()
+        self._size = 0
+
+    def get(self, task_id: int, default=None):
+        if task_id not in self._entries:
+            return default
+        self._entries.move_to_end(task_id)
+        return self._entries[task_id]
+
+    def put(self, task_id: int, notes: Optional[str]):
+        self.discard(task_id)
+        size = len(notes or "")
+        if size > self.max_chars:
+            return
+        self._entries[task_id] = notes
+        self._size += size
+        while self._size > self.max_chars:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted or "")
+
+    def discard(self, task_id: int):
+        if task_id in self._entries:
+            self._size -= len(self._entries.pop(task_id) or "")
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
+
+
+class RepositoryState:
+    """Session factory and caches for one database.
+
+    Each workspace (database file) has its own state, so switching databases
+    is a matter of pointing the module at a different state object; nothing
+    global is rebound and cached results of other workspaces stay valid.
+    """
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        # in-memory cache of list results (all tasks, per-tag views, tag counts),
+        # keyed by view and dropped as a whole whenever data changes
+        self.tasks_cache: Dict[tuple, list] = {}
+        self.notes_cache = _NotesCache()
+        # bumped on every write made through this state (store caches); the random
+        # generation identifies this state, e.g. in HTTP ETags
+        self.generation = uuid.uuid4().hex[:8]
+        self.version = 0
+
+    def session(self) -> Session:
+        return self.session_factory()
+
+    def invalidate(self):
+        self.tasks_cache.clear()
+        self.version += 1
+
+
+_state = RepositoryState()
+# per-thread / per-task override of the active state, see using()
+_override: ContextVar[Optional[RepositoryState]] = ContextVar("todo_repository_state", default=None)
+_MISSING = object()
+
+
+def _current() -> RepositoryState:
+    return _override.get() or _state
+
+
+def activate(state: Optional[RepositoryState] = None) -> RepositoryState:
+    """Make `state` the active database for all repository functions.
+
+    With no argument, go back to a fresh state on the global SessionLocal
+    configured by models.init_db().
+    """
+    global _state
+    _state = state if state is not None else RepositoryState()
+    return _state
+
+
+@contextmanager
+def using(state: RepositoryState):
+    """Run repository calls in this thread/task against `state` without changing the active one."""
+    token = _override.set(state)
+    try:
+        yield state
+    finally:
+        _override.reset(token)
 
-# Simple in-memory cache for list_tasks(show_all=True)
-_tasks_cache: Optional[List[Task]] = None
 
 def _invalidate_cache():
-    global _tasks_cache
-    _tasks_cache = None
+    _current().invalidate()
+
+# Change listeners, called after every successful write as fn(op, task_id, values)
+# where op is "add", "update" or "delete" and values is a snapshot of the task
+# columns after the write (None for deletes).
+_listeners: List[Callable[[str, int, Optional[dict]], None]] = []
+
+
+def add_listener(fn: Callable[[str, int, Optional[dict]], None]):
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+
+def remove_listener(fn: Callable[[str, int, Optional[dict]], None]):
+    try:
+        _listeners.remove(fn)
+    except ValueError:
+        pass
+
+
+def _snapshot(t: Task) -> dict:
+    return {
+        "id": t.id,
+        "title": t.title,
+        "done": bool(t.done),
+        "priority": t.priority,
+        "due_date": t.due_date,
+    }
+
+
+def _notify(op: str, task_id: int, values: Optional[dict] = None):
+    for fn in list(_listeners):
+        try:
+            fn(op, task_id, values)
+        except Exception:
+            pass
+
+
+# tasks that are not in the trash (see delete_task)
+_LIVE = Task.deleted_at.is_(None)
 
 
 def get_session() -> Session:
-    return SessionLocal()
+    return _current().session()
 
 
-def add_task(title: str, notes: Optional[str] = None, priority: int = 0, due_date=None, db_path: str = None) -> int:
-    s = get_session()
+def add_task(title: str, notes: Optional[str] = None, priority: int = 0, due_date=None, db_path: str = None,
+             *, done: bool = False, tags: Iterable[str] = ()) -> int:
+    """Insert a task; `done` and `tags` are written in the same transaction."""
+    names = _normalize_tags(tags)
+    st = _current()
+    s = st.session()
     try:
-        t = Task(title=title, notes=notes, priority=priority, due_date=due_date, created_at=datetime.now(timezone.utc))
+        t = Task(title=title, notes=notes, priority=priority, due_date=due_date, done=done,
+                 created_at=datetime.now(timezone.utc))
+        if names:
+            existing = {tag.name: tag for tag in s.query(Tag).filter(Tag.name.in_(names))}
+            t.tags = [existing.get(name) or Tag(name=name) for name in names]
         s.add(t)
         s.commit()
         s.refresh(t)
         # invalidate cache when data changes
-        _invalidate_cache()
+        st.invalidate()
+        st.notes_cache.put(t.id, notes)
+        _notify("add", t.id, _snapshot(t))
         return t.id
     finally:
         s.close()
 
 
 def list_tasks(show_all: bool = True) -> List[Task]:
-    s = get_session()
+    st = _current()
+    s = st.session()
     try:
         if show_all:
-            global _tasks_cache
-            if _tasks_cache is not None:
-                return _tasks_cache
-            res = s.query(Task).order_by(Task.done.asc(), Task.priority.desc(), Task.created_at.asc()).all()
-            _tasks_cache = res
+            cached = st.tasks_cache.get(("all",))
+            if cached is not None:
+                return cached
+            res = s.query(Task).filter(_LIVE).order_by(Task.done.asc(), Task.priority.desc(), Task.created_at.asc(), Task.id.asc()).all()
+            st.tasks_cache[("all",)] = res
             return res
-        return s.query(Task).filter(Task.done.is_(False)).order_by(Task.priority.desc(), Task.created_at.asc()).all()
+        return s.query(Task).filter(_LIVE, Task.done.is_(False)).order_by(Task.priority.desc(), Task.created_at.asc(), Task.id.asc()).all()
+    finally:
+        s.close()
+
+
+def start_of_day(now: Optional[datetime] = None) -> datetime:
+    """Local midnight of the day containing `now` (default: today), as an aware datetime."""
+    now = (now or datetime.now(timezone.utc)).astimezone()
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _due_range_query(s: Session, start: Optional[datetime], end: Optional[datetime], include_done: bool):
+    # filters on (done, due_date) so the ix_tasks_done_due_date index serves the range scan;
+    # `done IN (0, 1)` keeps the index usable when completed tasks are included as well
+    q = s.query(Task).filter(Task.done.in_([False, True]) if include_done else Task.done.is_(False), _LIVE)
+    if start is not None:
+        q = q.filter(Task.due_date >= start)
+    else:
+        q = q.filter(Task.due_date.isnot(None))
+    if end is not None:
+        q = q.filter(Task.due_date < end)
+    return q
+
+
+def list_due_between(start: Optional[datetime], end: Optional[datetime], include_done: bool = False) -> List[Task]:
+    """Tasks with start <= due_date < end, earliest first. Either bound may be None (open range)."""
+    st = _current()
+    s = st.session()
+    try:
+        q = _due_range_query(s, start, end, include_done)
+        return q.order_by(Task.due_date.asc(), Task.priority.desc(), Task.id.asc()).all()
+    finally:
+        s.close()
+
+
+def list_overdue(now: Optional[datetime] = None) -> List[Task]:
+    """Pending tasks whose due day is before today."""
+    return list_due_between(None, start_of_day(now))
+
+
+def list_due_today(now: Optional[datetime] = None) -> List[Task]:
+    start = start_of_day(now)
+    return list_due_between(start, start + timedelta(days=1))
+
+
+def list_due_within(days: int, now: Optional[datetime] = None) -> List[Task]:
+    """Pending tasks due from today through the next `days - 1` days."""
+    start = start_of_day(now)
+    return list_due_between(start, start + timedelta(days=days))
+
+
+def list_upcoming_due(after: Optional[datetime] = None) -> List[tuple]:
+    """(id, title, due_date) of pending tasks due at or after `after` (default: now), earliest first."""
+    after = after or datetime.now(timezone.utc)
+    st = _current()
+    s = st.session()
+    try:
+        q = s.query(Task.id, Task.title, Task.due_date).filter(Task.done.is_(False), Task.due_date >= after, _LIVE)
+        return [tuple(r) for r in q.order_by(Task.due_date.asc()).all()]
     finally:
         s.close()
 
 
+def count_due_per_day(start: Optional[datetime] = None, days: int = 7, include_done: bool = False) -> Dict[date, int]:
+    """Number of tasks due on each of `days` local days starting at `start` (default: today).
+
+    Counting is done by a single grouped query; days without tasks map to 0.
+    """
+    first = start_of_day(start)
+    st = _current()
+    s = st.session()
+    try:
+        day = func.date(Task.due_date, "unixepoch", "localtime")
+        q = _due_range_query(s, first, first + timedelta(days=days), include_done)
+        counts = dict(q.with_entities(day, func.count()).group_by(day).all())
+    finally:
+        s.close()
+    result = {}
+    for i in range(days):
+        d = (first + timedelta(days=i)).date()
+        result[d] = counts.get(d.isoformat(), 0)
+    return result
+
+
 def get_task(task_id: int) -> Optional[Task]:
-    s = get_session()
+    st = _current()
+    s = st.session()
+    try:
+        t = s.query(Task).options(undefer(Task.notes)).filter(Task.id == task_id, _LIVE).first()
+        if t:
+            st.notes_cache.put(t.id, t.notes)
+        return t
+    finally:
+        s.close()
+
+
+def get_task_notes(task_id: int) -> Optional[str]:
+    """Return the notes of a single task, loading them on demand.
+
+    list_tasks() does not load notes; callers that need them (tooltips) go
+    through this function, which keeps recently used notes in an LRU cache.
+    """
+    st = _current()
+    notes = st.notes_cache.get(task_id, _MISSING)
+    if notes is not _MISSING:
+        return notes
+    s = st.session()
     try:
-        return s.query(Task).filter(Task.id == task_id).first()
+        notes = s.query(Task.notes).filter(Task.id == task_id).scalar()
+        st.notes_cache.put(task_id, notes)
+        return notes
     finally:
         s.close()
 
 
 def set_done(task_id: int, done: bool = True) -> bool:
-    s = get_session()
+    st = _current()
+    s = st.session()
     try:
-        t = s.query(Task).filter(Task.id == task_id).first()
+        t = s.query(Task).filter(Task.id == task_id, _LIVE).first()
         if not t:
             return False
         t.done = done
         t.updated_at = datetime.now(timezone.utc)
         s.commit()
-        _invalidate_cache()
+        st.invalidate()
+        _notify("update", task_id, _snapshot(t))
         return True
     finally:
         s.close()
 
 
 def delete_task(task_id: int) -> bool:
-    s = get_session()
+    """Move a task to the trash: a single UPDATE setting its tombstone, undone by restore_task().
+
+    Deleted tasks disappear from every query here; maintenance.purge_deleted()
+    removes them for good once they are old enough.
+    """
+    st = _current()
+    s = st.session()
     try:
-        t = s.query(Task).filter(Task.id == task_id).first()
+        now = datetime.now(timezone.utc)
+        n = (
+            s.query(Task)
+            .filter(Task.id == task_id, _LIVE)
+            .update({Task.deleted_at: now, Task.updated_at: now}, synchronize_session=False)
+        )
+        s.commit()
+        if not n:
+            return False
+        st.invalidate()
+        st.notes_cache.discard(task_id)
+        _notify("delete", task_id)
+        return True
+    finally:
+        s.close()
+
+
+def restore_task(task_id: int) -> bool:
+    """Undo delete_task() for a task that has not been purged yet."""
+    st = _current()
+    s = st.session()
+    try:
+        t = s.query(Task).filter(Task.id == task_id, Task.deleted_at.isnot(None)).first()
         if not t:
             return False
-        s.delete(t)
+        t.deleted_at = None
+        t.updated_at = datetime.now(timezone.utc)
         s.commit()
-        _invalidate_cache()
+        st.invalidate()
+        # reported as an update: listeners already know the task from before it was deleted
+        _notify("update", task_id, _snapshot(t))
         return True
     finally:
         s.close()
 
 
 def update_task(task_id: int, **fields) -> bool:
-    s = get_session()
+    st = _current()
+    s = st.session()
     try:
-        t = s.query(Task).filter(Task.id == task_id).first()
+        t = s.query(Task).filter(Task.id == task_id, _LIVE).first()
         if not t:
             return False
         for k, v in fields.items():
@@ -92,7 +373,210 @@ def update_task(task_id: int, **fields) -> bool:
                 setattr(t, k, v)
         t.updated_at = datetime.now(timezone.utc)
         s.commit()
-        _invalidate_cache()
+        st.invalidate()
+        if "notes" in fields:
+            st.notes_cache.discard(task_id)
+        _notify("update", task_id, _snapshot(t))
+        return True
+    finally:
+        s.close()
+
+
+def title_stats() -> List[Tuple[str, int, Optional[datetime]]]:
+    """(title, number of tasks with that title, most recent created/updated time), one row per distinct title."""
+    st = _current()
+    s = st.session()
+    try:
+        last = func.max(func.coalesce(Task.updated_at, Task.created_at))
+        rows = s.query(Task.title, func.count(), last).filter(_LIVE).group_by(Task.title).all()
+        return [tuple(r) for r in rows]
+    finally:
+        s.close()
+
+
+def _normalize_tags(names: Iterable[str]) -> List[str]:
+    seen = []
+    for name in names:
+        name = (name or "").strip()
+        if name and name not in seen:
+            seen.append(name)
+    return seen
+
+
+def list_tags() -> List[Tag]:
+    st = _current()
+    s = st.session()
+    try:
+        return s.query(Tag).order_by(Tag.name.asc()).all()
+    finally:
+        s.close()
+
+
+def get_task_tags(task_id: int) -> List[str]:
+    st = _current()
+    s = st.session()
+    try:
+        q = s.query(Tag.name).join(task_tags, task_tags.c.tag_id == Tag.id).filter(task_tags.c.task_id == task_id)
+        return [name for (name,) in q.order_by(Tag.name.asc())]
+    finally:
+        s.close()
+
+
+def set_task_tags(task_id: int, names: Iterable[str]) -> bool:
+    """Replace the tags of a task, creating tags that do not exist yet."""
+    names = _normalize_tags(names)
+    st = _current()
+    s = st.session()
+    try:
+        t = s.query(Task).filter(Task.id == task_id, _LIVE).first()
+        if not t:
+            return False
+        existing = {tag.name: tag for tag in s.query(Tag).filter(Tag.name.in_(names))} if names else {}
+        t.tags = [existing.get(name) or Tag(name=name) for name in names]
+        s.commit()
+        st.invalidate()
+        _notify("update", task_id, _snapshot(t))
         return True
     finally:
         s.close()
+
+
+def _tagged_task_ids(names: List[str], match_all: bool):
+    ids = (
+        select(task_tags.c.task_id)
+        .join(Tag, Tag.id == task_tags.c.tag_id)
+        .where(Tag.name.in_(names))
+    )
+    if match_all:
+        # (task_id, tag_id) is the primary key, so count() counts distinct matching tags
+        ids = ids.group_by(task_tags.c.task_id).having(func.count() == len(names))
+    return ids
+
+
+def list_tasks_by_tags(names: Iterable[str], match_all: bool = False, show_all: bool = True) -> List[Task]:
+    """Tasks carrying any (match_all=False) or all (match_all=True) of the given tags.
+
+    Filtering is a single query: the tag ids are resolved through the unique
+    index on tags.name and the task ids come from the (tag_id, task_id) index.
+    """
+    names = _normalize_tags(names)
+    if not names:
+        return list_tasks(show_all=show_all)
+    key = ("tags", tuple(sorted(names)), match_all, show_all)
+    st = _current()
+    cached = st.tasks_cache.get(key)
+    if cached is not None:
+        return cached
+    s = st.session()
+    try:
+        q = s.query(Task).filter(Task.id.in_(_tagged_task_ids(names, match_all)), _LIVE)
+        if not show_all:
+            q = q.filter(Task.done.is_(False))
+        res = q.order_by(Task.done.asc(), Task.priority.desc(), Task.created_at.asc(), Task.id.asc()).all()
+        st.tasks_cache[key] = res
+        return res
+    finally:
+        s.close()
+
+
+def tag_counts() -> List[Tuple[str, int, int]]:
+    """(tag name, pending, completed) for every tag, from one grouped query."""
+    st = _current()
+    cached = st.tasks_cache.get(("tag_counts",))
+    if cached is not None:
+        return cached
+    s = st.session()
+    try:
+        pending = func.coalesce(func.sum(case((Task.done.is_(False), 1), else_=0)), 0)
+        completed = func.coalesce(func.sum(case((Task.done.is_(True), 1), else_=0)), 0)
+        q = (
+            s.query(Tag.name, pending, completed)
+            .outerjoin(task_tags, task_tags.c.tag_id == Tag.id)
+            .outerjoin(Task, (Task.id == task_tags.c.task_id) & _LIVE)
+            .group_by(Tag.id)
+            .order_by(Tag.name.asc())
+        )
+        res = [(name, int(p), int(c)) for name, p, c in q]
+        st.tasks_cache[("tag_counts",)] = res
+        return res
+    finally:
+        s.close()
+
+
+def _filtered_query(s: Session, done: Optional[bool] = None, tags: Optional[Iterable[str]] = None,
+                    match_all: bool = False, due_start: Optional[datetime] = None, due_end: Optional[datetime] = None):
+    if due_start is not None or due_end is not None:
+        q = _due_range_query(s, due_start, due_end, include_done=done is not False)
+        if done:
+            q = q.filter(Task.done.is_(True))
+    else:
+        q = s.query(Task).filter(_LIVE)
+        if done is not None:
+            q = q.filter(Task.done.is_(done))
+    names = _normalize_tags(tags or [])
+    if names:
+        q = q.filter(Task.id.in_(_tagged_task_ids(names, match_all)))
+    return q
+
+
+def list_tasks_page(offset: int = 0, limit: int = 50, **filters) -> List[Task]:
+    """One page of tasks in list order, filtered in SQL.
+
+    Accepted filters: done, tags, match_all, due_start, due_end.
+    """
+    st = _current()
+    s = st.session()
+    try:
+        q = _filtered_query(s, **filters)
+        q = q.order_by(Task.done.asc(), Task.priority.desc(), Task.created_at.asc(), Task.id.asc())
+        return q.offset(max(0, offset)).limit(max(0, limit)).all()
+    finally:
+        s.close()
+
+
+def list_tasks_after(after_id: int = 0, limit: int = 500, **filters) -> List[Task]:
+    """Up to `limit` tasks with id > after_id in id order (keyset pagination for full scans)."""
+    st = _current()
+    s = st.session()
+    try:
+        q = _filtered_query(s, **filters).filter(Task.id > after_id)
+        return q.order_by(Task.id.asc()).limit(limit).all()
+    finally:
+        s.close()
+
+
+def bulk_update(updates: Iterable[dict]) -> List[int]:
+    """Apply several updates in one transaction.
+
+    Each update is a dict with an "id" and the fields to set. Returns the ids
+    that existed and were updated.
+    """
+    updates = [dict(u) for u in updates]
+    st = _current()
+    s = st.session()
+    try:
+        ids = [u.get("id") for u in updates]
+        tasks = {t.id: t for t in s.query(Task).filter(Task.id.in_(ids), _LIVE)} if ids else {}
+        now = datetime.now(timezone.utc)
+        done_ids = []
+        for u in updates:
+            t = tasks.get(u.pop("id", None))
+            if t is None:
+                continue
+            for k, v in u.items():
+                if hasattr(t, k):
+                    setattr(t, k, v)
+            t.updated_at = now
+            done_ids.append(t.id)
+        if not done_ids:
+            return []
+        # snapshot before commit: afterwards every object would be reloaded one by one
+        snapshots = [_snapshot(tasks[tid]) for tid in done_ids]
+        s.commit()
+        st.invalidate()
+        for values in snapshots:
+            st.notes_cache.discard(values["id"])
+            _notify("update", values["id"], values)
+        return done_ids
+    finally:
+        s.close()
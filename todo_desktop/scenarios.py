@@ -0,0 +1,382 @@
+"""Replay scripted interactions against MainWindow and check their latency.
+
+    python -m todo_desktop.scenarios --tasks 5000 --budget toggle=150 --budget construct=2000:1500
+
+Runs headless (QT_QPA_PLATFORM=offscreen unless set otherwise) on a seeded
+database in a temporary directory. For every action two numbers are taken:
+
+- wall: time of the call itself plus handling the events it posted
+  (repaints, resize and layout events);
+- stall: the longest time the event loop could not run a 5 ms heartbeat
+  timer around the action, i.e. how long the window would appear frozen.
+
+An action fails when either exceeds its budget. The exit status is 1 if any
+action failed.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import QElapsedTimer, QEventLoop, QObject, Qt, QTimer  # noqa: E402
+from PySide6.QtWidgets import QApplication, QMessageBox  # noqa: E402
+
+from .models import compress_notes, create_db_engine  # noqa: E402
+
+HEARTBEAT_MS = 5
+
+
+class Budget(NamedTuple):
+    wall_ms: float
+    stall_ms: float
+
+
+class ActionResult(NamedTuple):
+    name: str
+    wall_ms: float
+    stall_ms: float
+
+
+# generous defaults meant to catch regressions of an order of magnitude on a few thousand tasks;
+# tighten them per machine with --budget
+DEFAULT_BUDGETS: Dict[str, Budget] = {
+    "construct": Budget(5000, 5000),
+    "add": Budget(1000, 1000),
+    "edit": Budget(1000, 1000),
+    "toggle": Budget(1000, 1000),
+    "delete": Budget(1000, 1000),
+    "undo": Budget(1000, 1000),
+    "resize": Budget(1000, 1000),
+    "font": Budget(1000, 1000),
+    "language": Budget(1000, 1000),
+    "view": Budget(1000, 1000),
+}
+
+DEFAULT_SCRIPT: List[Tuple[str, dict]] = [
+    ("add", {"title": "Scenario task", "priority": 10}),
+    ("toggle", {"row": 0}),
+    ("toggle", {"row": 0}),
+    ("edit", {"row": 0, "title": "Scenario task (edited)"}),
+    ("resize", {"width": 1280, "height": 800}),
+    ("resize", {"width": 700, "height": 500}),
+    ("font", {"size": 16}),
+    ("font", {"size": 11}),
+    ("language", {}),
+    ("language", {}),
+    ("view", {"view": "week"}),
+    ("view", {"view": "all"}),
+    ("delete", {"row": 0}),
+    ("undo", {}),
+]
+
+
+def seed_database(path: str, tasks: int, seed: int = 0) -> str:
+    """Create `path` with `tasks` tasks: mixed priorities, due dates, done flags and notes."""
+    create_db_engine(path).dispose()
+    rnd = random.Random(seed)
+    now = int(datetime.now(timezone.utc).timestamp())
+    rows = []
+    for i in range(tasks):
+        notes = None
+        if i % 7 == 0:
+            notes = compress_notes(f"notes for task {i}\n" * rnd.choice((1, 10, 400)))
+        due = now + rnd.randint(-20, 40) * 86400 if i % 3 else None
+        rows.append((f"Task {i} {rnd.choice(('report', 'call', 'review', 'buy', 'fix'))}", notes, notes is not None,
+                     rnd.random() < 0.3, rnd.randint(0, 10), due, now - (tasks - i) * 60, uuid.uuid4().hex))
+    con = sqlite3.connect(path)
+    try:
+        with con:
+            con.executemany(
+                "INSERT INTO tasks (title, notes, has_notes, done, priority, due_date, created_at, uid) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            con.execute("DELETE FROM change_log")
+    finally:
+        con.close()
+    return path
+
+
+class StallMonitor(QObject):
+    """Heartbeat timer recording how late each tick was."""
+
+    def __init__(self, interval_ms: int = HEARTBEAT_MS, parent=None):
+        super().__init__(parent)
+        self.interval_ms = interval_ms
+        self._clock = QElapsedTimer()
+        self._ticks: List[float] = []
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self._tick)
+
+    def now(self) -> float:
+        return self._clock.nsecsElapsed() / 1e6
+
+    def start(self):
+        self._clock.start()
+        self._ticks = [0.0]
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+
+    def _tick(self):
+        self._ticks.append(self.now())
+
+    def max_stall(self, start: float, end: float) -> float:
+        """Longest gap between heartbeats (beyond the interval) overlapping [start, end]."""
+        ticks = self._ticks
+        i = len(ticks) - 1
+        while i > 0 and ticks[i - 1] >= start:
+            i -= 1
+        worst = 0.0
+        prev = ticks[i - 1] if i > 0 else ticks[0]
+        for t in ticks[i:] + [end]:
+            if t > end:
+                t = end
+            worst = max(worst, t - prev - self.interval_ms)
+            prev = t
+            if t >= end:
+                break
+        return max(0.0, worst)
+
+
+def _run_loop(ms: int):
+    loop = QEventLoop()
+    QTimer.singleShot(ms, loop.quit)
+    loop.exec()
+
+
+class _ScriptedDialog:
+    """Stands in for TaskDialog: accepts immediately with the values given by the script.
+
+    Like the real dialog it starts from the edited task, so fields the script
+    leaves out keep their current value.
+    """
+
+    values: dict = {}
+
+    def __init__(self, parent=None, task=None, tags=None, title_index=None):
+        self.task = task
+        self.tags = list(tags or [])
+
+    def exec(self):
+        return True
+
+    def get_values(self):
+        v, t = self.values, self.task
+        return (
+            v.get("title") or (t.title if t else "Scenario task"),
+            v.get("notes", t.notes if t else None),
+            v.get("priority", (t.priority or 0) if t else 0),
+            v.get("due_date", t.due_date if t else None),
+        )
+
+    def get_tags(self):
+        return list(self.values.get("tags", self.tags))
+
+
+class _ScriptedMessageBox:
+    """Stands in for QMessageBox: confirms every question, shows nothing."""
+
+    StandardButton = QMessageBox.StandardButton
+
+    @staticmethod
+    def question(*args, **kwargs):
+        return QMessageBox.StandardButton.Yes
+
+    @staticmethod
+    def information(*args, **kwargs):
+        return QMessageBox.StandardButton.Ok
+
+    warning = information
+
+
+@contextmanager
+def _scripted_dialogs(**values):
+    # the window looks both names up in its module at call time, so swapping them there
+    # replaces the modal dialogs without touching the Qt classes themselves
+    from .ui import main_window
+
+    _ScriptedDialog.values = values
+    saved = main_window.TaskDialog, main_window.QMessageBox
+    main_window.TaskDialog, main_window.QMessageBox = _ScriptedDialog, _ScriptedMessageBox
+    try:
+        yield
+    finally:
+        main_window.TaskDialog, main_window.QMessageBox = saved
+
+
+def _select_row(window, row: int):
+    window.table.selectRow(min(row, max(0, window.model.rowCount() - 1)))
+
+
+def _act_add(window, **values):
+    with _scripted_dialogs(**values):
+        window.on_add()
+
+
+def _act_edit(window, row: int = 0, **values):
+    _select_row(window, row)
+    with _scripted_dialogs(**values):
+        window.on_edit()
+
+
+def _act_toggle(window, row: int = 0):
+    window.on_status_click(window.model.index(row, 1))
+
+
+def _act_delete(window, row: int = 0):
+    _select_row(window, row)
+    with _scripted_dialogs():
+        window.on_delete()
+
+
+def _act_undo(window):
+    window.on_undo_delete()
+
+
+def _act_resize(window, width: int, height: int):
+    window.resize(width, height)
+
+
+def _act_font(window, size: int):
+    window.font_spin.setValue(size)  # emits valueChanged -> _on_font_size_changed
+
+
+def _act_language(window):
+    window._toggle_language()
+
+
+def _act_view(window, view: str):
+    window._set_view(view)
+
+
+ACTIONS: Dict[str, Callable] = {
+    "add": _act_add,
+    "edit": _act_edit,
+    "toggle": _act_toggle,
+    "delete": _act_delete,
+    "undo": _act_undo,
+    "resize": _act_resize,
+    "font": _act_font,
+    "language": _act_language,
+    "view": _act_view,
+}
+
+
+def _measure(app, monitor: StallMonitor, name: str, fn: Callable[[], object], settle_ms: int) -> Tuple[ActionResult, object]:
+    start = monitor.now()
+    t0 = time.perf_counter()
+    value = fn()
+    app.processEvents()
+    wall = (time.perf_counter() - t0) * 1000
+    # let the heartbeat (and anything the action scheduled) run before reading the stall
+    _run_loop(settle_ms)
+    return ActionResult(name, wall, monitor.max_stall(start, monitor.now())), value
+
+
+def run_scenario(db_path: str, script: Iterable[Tuple[str, dict]] = DEFAULT_SCRIPT,
+                 settle_ms: int = 4 * HEARTBEAT_MS) -> List[ActionResult]:
+    """Open MainWindow on `db_path`, replay `script` and return one result per action
+    (the first one being the window construction)."""
+    from .ui.main_window import MainWindow
+
+    app = QApplication.instance() or QApplication([])
+    monitor = StallMonitor()
+    monitor.start()
+    _run_loop(settle_ms)
+    results = []
+    window = None
+    try:
+        def construct():
+            w = MainWindow(db_path=db_path)
+            w.show()
+            return w
+
+        result, window = _measure(app, monitor, "construct", construct, settle_ms)
+        results.append(result)
+        for name, args in script:
+            action = ACTIONS.get(name)
+            if action is None:
+                raise ValueError(f"unknown action: {name!r} (expected one of {', '.join(ACTIONS)})")
+            result, _ = _measure(app, monitor, name, lambda: action(window, **(args or {})), settle_ms)
+            results.append(result)
+    finally:
+        monitor.stop()
+        if window is not None:
+            window.close()
+            window.workspaces.close_all()
+            window.deleteLater()
+            app.processEvents()
+    return results
+
+
+def check_budgets(results: Iterable[ActionResult], budgets: Optional[Dict[str, Budget]] = None) -> List[str]:
+    """Descriptions of every action that exceeded its budget (empty when all are within)."""
+    budgets = DEFAULT_BUDGETS if budgets is None else budgets
+    failures = []
+    for r in results:
+        budget = budgets.get(r.name)
+        if budget is None:
+            continue
+        if r.wall_ms > budget.wall_ms:
+            failures.append(f"{r.name}: wall {r.wall_ms:.1f} ms > {budget.wall_ms:g} ms")
+        if r.stall_ms > budget.stall_ms:
+            failures.append(f"{r.name}: stall {r.stall_ms:.1f} ms > {budget.stall_ms:g} ms")
+    return failures
+
+
+def format_results(results: Iterable[ActionResult]) -> str:
+    lines = [f"{'action':<12}{'wall ms':>10}{'stall ms':>10}"]
+    for r in results:
+        lines.append(f"{r.name:<12}{r.wall_ms:>10.1f}{r.stall_ms:>10.1f}")
+    return "\n".join(lines)
+
+
+def _parse_budget(text: str) -> Tuple[str, Budget]:
+    name, _, limits = text.partition("=")
+    wall, _, stall = limits.partition(":")
+    try:
+        wall_ms = float(wall)
+        return name, Budget(wall_ms, float(stall) if stall else wall_ms)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected ACTION=WALL_MS[:STALL_MS], got {text!r}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m todo_desktop.scenarios", description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=2000, help="number of tasks to seed (default: 2000)")
+    parser.add_argument("--script", help="JSON file with a list of [action, {args}] pairs (default: built-in)")
+    parser.add_argument("--budget", action="append", type=_parse_budget, default=[],
+                        help="ACTION=WALL_MS[:STALL_MS], overrides the default budget (repeatable)")
+    args = parser.parse_args(argv)
+
+    script = DEFAULT_SCRIPT
+    if args.script:
+        script = [tuple(step) for step in json.loads(Path(args.script).read_text(encoding="utf-8"))]
+    budgets = dict(DEFAULT_BUDGETS)
+    budgets.update(args.budget)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = seed_database(os.path.join(tmp, "scenario.db"), args.tasks)
+        results = run_scenario(db_path, script)
+    print(format_results(results))
+    failures = check_budgets(results, budgets)
+    for f in failures:
+        print("OVER BUDGET", f)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
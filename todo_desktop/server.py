@@ -0,0 +1,436 @@
+"""Local HTTP/JSON API over the repository layer (`python -m todo_desktop serve`).
+
+The server is a small asyncio HTTP/1.1 implementation (keep-alive, chunked
+streaming) so it needs no extra dependencies. All database work goes through
+the repository functions on one engine, run on a single worker thread so
+SQLite never sees competing writers from this process.
+"""
+import asyncio
+import json
+import traceback
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+from . import repository, sync
+from .models import create_db_engine, make_sessionmaker
+
+MAX_BODY = 10 * 1024 * 1024
+MAX_PAGE = 1000
+STREAM_BATCH = 500
+# fields clients may set through POST / PATCH
+EDITABLE_FIELDS = ("title", "notes", "priority", "due_date", "done")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+        self.message = message or HTTPStatus(status).phrase
+
+
+class _Request:
+    def __init__(self, method: str, target: str, headers: dict, body: bytes):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = parts.path.rstrip("/") or "/"
+        self.query = parse_qs(parts.query)
+        self.headers = headers
+        self.body = body
+
+    def arg(self, name: str, default=None):
+        values = self.query.get(name)
+        return values[-1] if values else default
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            raise HTTPError(400, "invalid JSON body")
+
+
+def _iso(dt: Optional[datetime]) -> Optional[str]:
+    return dt.isoformat() if dt else None
+
+
+def task_to_dict(t, notes: bool = False) -> dict:
+    d = {
+        "id": t.id,
+        "title": t.title,
+        "done": bool(t.done),
+        "priority": t.priority or 0,
+        "due_date": _iso(t.due_date),
+        "created_at": _iso(t.created_at),
+        "updated_at": _iso(t.updated_at),
+        "has_notes": bool(t.has_notes),
+    }
+    if notes:
+        d["notes"] = t.notes
+    return d
+
+
+def _parse_fields(data) -> dict:
+    if not isinstance(data, dict):
+        raise HTTPError(400, "expected a JSON object")
+    fields = {k: data[k] for k in EDITABLE_FIELDS if k in data}
+    if "due_date" in fields and fields["due_date"] is not None:
+        try:
+            fields["due_date"] = datetime.fromisoformat(fields["due_date"])
+        except (TypeError, ValueError):
+            raise HTTPError(400, "due_date must be an ISO 8601 date/time")
+    if "title" in fields and not (isinstance(fields["title"], str) and fields["title"].strip()):
+        raise HTTPError(400, "title must be a non-empty string")
+    if "notes" in fields and not (fields["notes"] is None or isinstance(fields["notes"], str)):
+        raise HTTPError(400, "notes must be a string or null")
+    # bool is a subclass of int
+    if "priority" in fields and (not isinstance(fields["priority"], int) or isinstance(fields["priority"], bool)):
+        raise HTTPError(400, "priority must be an integer")
+    if "done" in fields and not isinstance(fields["done"], bool):
+        raise HTTPError(400, "done must be a boolean")
+    return fields
+
+
+def _parse_tags(data) -> Optional[list]:
+    tags = data.get("tags")
+    if tags is not None and not (isinstance(tags, list) and all(isinstance(t, str) for t in tags)):
+        raise HTTPError(400, "tags must be a list of strings")
+    return tags
+
+
+def _list_filters(req: _Request) -> dict:
+    filters = {}
+    done = req.arg("done")
+    if done is not None:
+        filters["done"] = done.lower() in ("1", "true", "yes")
+    tags = req.query.get("tag")
+    if tags:
+        filters["tags"] = tags
+        filters["match_all"] = req.arg("match") == "all"
+    due = req.arg("due")
+    if due:
+        today = repository.start_of_day()
+        if due == "overdue":
+            filters.update(due_end=today, done=False)
+        elif due == "today":
+            filters.update(due_start=today, due_end=today + timedelta(days=1))
+        elif due == "week":
+            filters.update(due_start=today, due_end=today + timedelta(days=7))
+        else:
+            raise HTTPError(400, "due must be one of overdue, today, week")
+    return filters
+
+
+def _int_arg(req: _Request, name: str, default: int, lo: int = 0, hi: Optional[int] = None) -> int:
+    try:
+        value = int(req.arg(name, default))
+    except ValueError:
+        raise HTTPError(400, f"{name} must be an integer")
+    value = max(lo, value)
+    return min(hi, value) if hi is not None else value
+
+
+class TaskServer:
+    def __init__(self, db_path: str, host: str = "127.0.0.1", port: int = 8765):
+        self.db_path = db_path
+        self.host = host
+        self.port = port
+        self.engine = None
+        self.state: Optional[repository.RepositoryState] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="todo-db")
+        self._server = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.engine = await loop.run_in_executor(self._executor, create_db_engine, self.db_path)
+        self.state = repository.RepositoryState(make_sessionmaker(self.engine))
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self._executor.shutdown(wait=True)
+        if self.engine is not None:
+            self.engine.dispose()
+
+    async def _db(self, fn, *args, **kwargs):
+        """Run a repository function against this server's database on the db thread."""
+        def call():
+            with repository.using(self.state):
+                return fn(*args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    # -- HTTP plumbing -------------------------------------------------------
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                req = await self._read_request(reader, writer)
+                if req is None:
+                    break
+                keep_alive = req.headers.get("connection", "").lower() != "close"
+                try:
+                    await self._dispatch(req, writer)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": e.message})
+                except Exception:
+                    # the exception text may quote SQL and values; keep it out of the response
+                    traceback.print_exc()
+                    await self._send_json(writer, 500, {"error": HTTPStatus(500).phrase})
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _read_request(self, reader, writer) -> Optional[_Request]:
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            await self._send_json(writer, 400, {"error": "malformed request line"}, close=True)
+            return None
+        headers = {}
+        while True:
+            h = await reader.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = h.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            await self._send_json(writer, 400, {"error": "invalid Content-Length"}, close=True)
+            return None
+        if length > MAX_BODY:
+            await self._send_json(writer, 413, {"error": "request body too large"}, close=True)
+            return None
+        body = await reader.readexactly(length) if length else b""
+        return _Request(method.upper(), target, headers, body)
+
+    async def _send(self, writer, status: int, body: bytes = b"", content_type: str = "application/json",
+                    headers: Optional[dict] = None, close: bool = False):
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}"]
+        if body or status not in (204, 304):
+            lines.append(f"Content-Type: {content_type}")
+            lines.append(f"Content-Length: {len(body)}")
+        for k, v in (headers or {}).items():
+            lines.append(f"{k}: {v}")
+        if close:
+            lines.append("Connection: close")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status: int, payload, headers: Optional[dict] = None, close: bool = False):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await self._send(writer, status, body, "application/json; charset=utf-8", headers, close)
+
+    # -- routing ---------------------------------------------------------------
+
+    async def _dispatch(self, req: _Request, writer):
+        parts = [p for p in req.path.split("/") if p]
+        if parts == ["tasks"] or parts == ["tasks.ndjson"]:
+            if req.method == "GET":
+                ndjson = parts[0].endswith(".ndjson") or "application/x-ndjson" in req.headers.get("accept", "")
+                return await (self._stream_tasks(req, writer) if ndjson else self._list_tasks(req, writer))
+            if req.method == "POST":
+                return await self._create_task(req, writer)
+            if req.method == "PATCH":
+                return await self._bulk_update(req, writer)
+            raise HTTPError(405)
+        if parts == ["sync", "changes"]:
+            if req.method == "GET":
+                return await self._sync_pull(req, writer)
+            if req.method == "POST":
+                return await self._sync_push(req, writer)
+            raise HTTPError(405)
+        if len(parts) == 2 and parts[0] == "tasks":
+            try:
+                task_id = int(parts[1])
+            except ValueError:
+                raise HTTPError(404)
+            if req.method == "GET":
+                return await self._get_task(task_id, writer)
+            if req.method in ("PATCH", "PUT"):
+                return await self._update_task(task_id, req, writer)
+            if req.method == "DELETE":
+                return await self._delete_task(task_id, writer)
+            raise HTTPError(405)
+        raise HTTPError(404)
+
+    async def _etag(self, req: _Request) -> str:
+        # computed before the query runs: a write racing with the query can only
+        # make the ETag older than the data (an extra 200 later), never newer.
+        # The change log sequence also moves for writes from other processes (e.g. the GUI).
+        seq = await self._db(sync.last_change_seq)
+        key = (req.path, sorted((k, tuple(v)) for k, v in req.query.items()))
+        if req.arg("due"):
+            # due=today|week|overdue are relative to the current local day
+            key += (repository.start_of_day().isoformat(),)
+        digest = zlib.crc32(repr(key).encode("utf-8"))
+        return f'"{self.state.generation}-{seq}-{digest:08x}"'
+
+    def _not_modified(self, req: _Request, etag: str) -> bool:
+        tags = [t.strip() for t in req.headers.get("if-none-match", "").split(",")]
+        return etag in tags or "*" in tags
+
+    # -- handlers --------------------------------------------------------------
+
+    async def _list_tasks(self, req: _Request, writer):
+        etag = await self._etag(req)
+        if self._not_modified(req, etag):
+            return await self._send(writer, 304, headers={"ETag": etag})
+        offset = _int_arg(req, "offset", 0)
+        limit = _int_arg(req, "limit", 50, 1, MAX_PAGE)
+        # fetch one extra row to know whether there is a next page without counting
+        rows = await self._db(repository.list_tasks_page, offset, limit + 1, **_list_filters(req))
+        payload = {
+            "items": [task_to_dict(t) for t in rows[:limit]],
+            "offset": offset,
+            "limit": limit,
+            "next_offset": offset + limit if len(rows) > limit else None,
+        }
+        await self._send_json(writer, 200, payload, headers={"ETag": etag})
+
+    async def _stream_tasks(self, req: _Request, writer):
+        """Stream every matching task as one JSON object per line, in id order."""
+        etag = await self._etag(req)
+        if self._not_modified(req, etag):
+            return await self._send(writer, 304, headers={"ETag": etag})
+        filters = _list_filters(req)
+        writer.write(
+            (
+                "HTTP/1.1 200 OK\r\n"
+                "Content-Type: application/x-ndjson\r\n"
+                "Transfer-Encoding: chunked\r\n"
+                f"ETag: {etag}\r\n\r\n"
+            ).encode("latin-1")
+        )
+        after = 0
+        try:
+            while True:
+                rows = await self._db(repository.list_tasks_after, after, STREAM_BATCH, **filters)
+                if not rows:
+                    break
+                chunk = "".join(json.dumps(task_to_dict(t), ensure_ascii=False) + "\n" for t in rows).encode("utf-8")
+                writer.write(f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n")
+                await writer.drain()
+                after = rows[-1].id
+                if len(rows) < STREAM_BATCH:
+                    break
+        except Exception as e:
+            # the status line is already sent; the only way to signal failure is to drop the connection
+            raise ConnectionAbortedError(str(e))
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _get_task(self, task_id: int, writer):
+        def load():
+            t = repository.get_task(task_id)
+            if t is None:
+                return None
+            d = task_to_dict(t, notes=True)
+            d["tags"] = repository.get_task_tags(task_id)
+            return d
+
+        d = await self._db(load)
+        if d is None:
+            raise HTTPError(404, "task not found")
+        await self._send_json(writer, 200, d)
+
+    async def _create_task(self, req: _Request, writer):
+        data = req.json()
+        fields = _parse_fields(data)
+        if "title" not in fields:
+            raise HTTPError(400, "title is required")
+        tid = await self._db(
+            repository.add_task,
+            title=fields["title"], notes=fields.get("notes"), priority=fields.get("priority", 0),
+            due_date=fields.get("due_date"), done=fields.get("done", False), tags=_parse_tags(data) or (),
+        )
+        await self._send_json(writer, 201, {"id": tid}, headers={"Location": f"/tasks/{tid}"})
+
+    async def _update_task(self, task_id: int, req: _Request, writer):
+        data = req.json()
+        fields = _parse_fields(data)
+        tags = _parse_tags(data)
+
+        def update():
+            ok = repository.update_task(task_id, **fields)
+            if ok and tags is not None:
+                repository.set_task_tags(task_id, tags)
+            return ok
+
+        if not await self._db(update):
+            raise HTTPError(404, "task not found")
+        await self._send_json(writer, 200, {"id": task_id})
+
+    async def _bulk_update(self, req: _Request, writer):
+        data = req.json()
+        if not isinstance(data, list):
+            raise HTTPError(400, "expected a JSON array of updates")
+        updates = []
+        for item in data:
+            fields = _parse_fields(item)
+            if not isinstance(item.get("id"), int):
+                raise HTTPError(400, "every update needs an integer id")
+            fields["id"] = item["id"]
+            updates.append(fields)
+        updated = await self._db(repository.bulk_update, updates)
+        missing = sorted({u["id"] for u in updates} - set(updated))
+        await self._send_json(writer, 200, {"updated": updated, "missing": missing})
+
+    async def _delete_task(self, task_id: int, writer):
+        if not await self._db(repository.delete_task, task_id):
+            raise HTTPError(404, "task not found")
+        await self._send(writer, 204)
+
+    async def _sync_pull(self, req: _Request, writer):
+        since = _int_arg(req, "since", 0)
+        limit = _int_arg(req, "limit", sync.BATCH, 1, sync.BATCH)
+        until = _int_arg(req, "until", 0) if req.arg("until") is not None else None
+        changes, cursor, has_more = await self._db(sync.export_changes, since, limit, until=until)
+        await self._send_json(writer, 200, {"changes": changes, "cursor": cursor, "has_more": has_more})
+
+    async def _sync_push(self, req: _Request, writer):
+        data = req.json()
+        changes = data.get("changes") if isinstance(data, dict) else None
+        if not isinstance(changes, list) or not all(isinstance(c, dict) for c in changes):
+            raise HTTPError(400, "expected {\"changes\": [...]}")
+        applied, log = await self._db(sync.apply_pushed_changes, changes)
+        # the log range lets the client skip its own changes when it pulls next
+        await self._send_json(writer, 200, {"applied": applied, "log": list(log)})
+
+
+def run_server(db_path: str, host: str = "127.0.0.1", port: int = 8765):
+    async def main():
+        server = TaskServer(db_path, host, port)
+        await server.start()
+        print(f"Serving {db_path} on http://{server.host}:{server.port}", flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,439 @@
+"""Interchangeable task storage backends.
+
+`TaskStore` is the subset of the repository used by the hot paths of the UI
+(listing, toggling, editing, reading notes, due-date ranges). Three
+implementations are provided:
+
+- SQLAlchemyStore: the repository functions, i.e. the ORM (default).
+- SQLiteStore: plain sqlite3 on the same database file, with fixed SQL
+  strings (kept prepared by sqlite3's statement cache) and tuple rows, which
+  skips ORM object construction and identity-map bookkeeping.
+- MemoryStore: dicts only, nothing is saved; for tests and benchmarks.
+
+All of them return task rows with the same attributes as `Task` (notes are
+only filled in by get_task), set `uid` / `has_notes` the way the ORM does and
+report writes to the repository change listeners. Tags, sync and the other
+repository features still go through the repository module.
+"""
+import os
+import sqlite3
+import uuid
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Protocol, Tuple
+
+from . import repository
+from .models import compress_notes, create_db_engine, decompress_notes, from_epoch, to_epoch
+
+BACKENDS = ("sqlalchemy", "sqlite", "memory")
+# backends that read and write the database file; the window keeps tags, reminders
+# and sync state in that database, so it can only use these
+PERSISTENT_BACKENDS = ("sqlalchemy", "sqlite")
+DEFAULT_BACKEND = "sqlalchemy"
+# fields update_task() accepts; anything else is ignored, as in repository.update_task()
+EDITABLE_FIELDS = ("title", "notes", "done", "priority", "due_date")
+
+
+class TaskRow(NamedTuple):
+    id: int
+    title: str
+    done: bool
+    priority: int
+    due_date: Optional[datetime]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    has_notes: bool
+    uid: str
+    notes: Optional[str] = None
+
+
+class TaskStore(Protocol):
+    def add_task(self, title: str, notes: Optional[str] = None, priority: int = 0, due_date=None) -> int: ...
+
+    def get_task(self, task_id: int): ...
+
+    def get_task_notes(self, task_id: int) -> Optional[str]: ...
+
+    def list_tasks(self, show_all: bool = True) -> list: ...
+
+    def list_due_between(self, start: Optional[datetime], end: Optional[datetime],
+                         include_done: bool = False) -> list: ...
+
+    def list_upcoming_due(self, after: Optional[datetime] = None) -> List[tuple]: ...
+
+    def set_done(self, task_id: int, done: bool = True) -> bool: ...
+
+    def update_task(self, task_id: int, **fields) -> bool: ...
+
+    def delete_task(self, task_id: int) -> bool: ...
+
+    def restore_task(self, task_id: int) -> bool: ...
+
+    def close(self): ...
+
+
+def _now_epoch() -> int:
+    return int(datetime.now(timezone.utc).timestamp())
+
+
+def _snapshot(row: TaskRow) -> dict:
+    return {"id": row.id, "title": row.title, "done": row.done, "priority": row.priority, "due_date": row.due_date}
+
+
+class SQLAlchemyStore:
+    """The repository functions, run against `state` (default: the active database)."""
+
+    def __init__(self, state: Optional[repository.RepositoryState] = None):
+        self.state = state
+
+    def _call(self, fn, *args, **kwargs):
+        if self.state is None:
+            return fn(*args, **kwargs)
+        with repository.using(self.state):
+            return fn(*args, **kwargs)
+
+    def add_task(self, title: str, notes: Optional[str] = None, priority: int = 0, due_date=None) -> int:
+        return self._call(repository.add_task, title=title, notes=notes, priority=priority, due_date=due_date)
+
+    def get_task(self, task_id: int):
+        return self._call(repository.get_task, task_id)
+
+    def get_task_notes(self, task_id: int) -> Optional[str]:
+        return self._call(repository.get_task_notes, task_id)
+
+    def list_tasks(self, show_all: bool = True) -> list:
+        return self._call(repository.list_tasks, show_all=show_all)
+
+    def list_due_between(self, start, end, include_done: bool = False) -> list:
+        return self._call(repository.list_due_between, start, end, include_done=include_done)
+
+    def list_upcoming_due(self, after: Optional[datetime] = None) -> List[tuple]:
+        return self._call(repository.list_upcoming_due, after)
+
+    def set_done(self, task_id: int, done: bool = True) -> bool:
+        return self._call(repository.set_done, task_id, done)
+
+    def update_task(self, task_id: int, **fields) -> bool:
+        return self._call(repository.update_task, task_id, **fields)
+
+    def delete_task(self, task_id: int) -> bool:
+        return self._call(repository.delete_task, task_id)
+
+    def restore_task(self, task_id: int) -> bool:
+        return self._call(repository.restore_task, task_id)
+
+    def close(self):
+        pass
+
+
+_COLUMNS = "id, title, done, priority, due_date, created_at, updated_at, has_notes, uid"
+_SQL_INSERT = (
+    "INSERT INTO tasks (title, notes, has_notes, done, priority, due_date, created_at, uid) "
+    "VALUES (?, ?, ?, 0, ?, ?, ?, ?)"
+)
+_SQL_LIST_ALL = f"SELECT {_COLUMNS} FROM tasks WHERE deleted_at IS NULL ORDER BY done, priority DESC, created_at, id"
+_SQL_LIST_PENDING = (
+    f"SELECT {_COLUMNS} FROM tasks WHERE done = 0 AND deleted_at IS NULL ORDER BY priority DESC, created_at, id"
+)
+_SQL_GET = f"SELECT {_COLUMNS}, notes FROM tasks WHERE id = ? AND deleted_at IS NULL"
+_SQL_NOTES = "SELECT notes FROM tasks WHERE id = ?"
+_SQL_SET_DONE = "UPDATE tasks SET done = ?, updated_at = ? WHERE id = ? AND deleted_at IS NULL"
+_SQL_DELETE = "UPDATE tasks SET deleted_at = ?1, updated_at = ?1 WHERE id = ?2 AND deleted_at IS NULL"
+_SQL_RESTORE = "UPDATE tasks SET deleted_at = NULL, updated_at = ? WHERE id = ? AND deleted_at IS NOT NULL"
+_SQL_UPCOMING = (
+    "SELECT id, title, due_date FROM tasks WHERE done = 0 AND due_date >= ? AND deleted_at IS NULL ORDER BY due_date"
+)
+
+
+def _due_sql(has_start: bool, has_end: bool, include_done: bool) -> str:
+    # same shape as repository._due_range_query, so ix_tasks_done_due_date serves it
+    where = ["done IN (0, 1)" if include_done else "done = 0",
+             "due_date >= ?" if has_start else "due_date IS NOT NULL", "deleted_at IS NULL"]
+    if has_end:
+        where.append("due_date < ?")
+    return f"SELECT {_COLUMNS} FROM tasks WHERE {' AND '.join(where)} ORDER BY due_date, priority DESC, id"
+
+
+# building an aware local datetime dominates row conversion; reloading a list sees the same
+# timestamps again, and datetimes are immutable, so converted values can be shared
+_datetime = lru_cache(maxsize=1 << 16)(from_epoch)
+
+
+def _from_db(r: tuple) -> TaskRow:
+    return TaskRow(r[0], r[1], bool(r[2]), r[3], _datetime(r[4]), _datetime(r[5]), _datetime(r[6]),
+                   bool(r[7]), r[8], decompress_notes(r[9]) if len(r) > 9 else None)
+
+
+class SQLiteStore:
+    """Tasks through a plain sqlite3 connection.
+
+    The schema (and any pending migration) is set up through
+    models.create_db_engine() first, so this works on the same files as the
+    ORM and the change-log triggers still record every write. Pass the
+    `state` of the same database to share its notes cache and to have writes
+    made here invalidate its cached lists (and vice versa).
+    """
+
+    def __init__(self, db_path: str, state: Optional[repository.RepositoryState] = None, cached_statements: int = 64):
+        create_db_engine(db_path).dispose()
+        self.db_path = db_path
+        self.state = state
+        self._conn = sqlite3.connect(db_path, cached_statements=cached_statements)
+        self._notes = state.notes_cache if state is not None else repository._NotesCache()
+        self._cache: Dict[tuple, Tuple[int, list]] = {}
+        self._writes = 0
+
+    def _version(self) -> int:
+        return self.state.version if self.state is not None else self._writes
+
+    def _changed(self):
+        self._writes += 1
+        self._cache.clear()
+        if self.state is not None:
+            self.state.invalidate()
+
+    def _get(self, task_id: int) -> Optional[TaskRow]:
+        r = self._conn.execute(_SQL_GET, (task_id,)).fetchone()
+        return _from_db(r) if r else None
+
+    def add_task(self, title: str, notes: Optional[str] = None, priority: int = 0, due_date=None) -> int:
+        with self._conn:
+            cur = self._conn.execute(_SQL_INSERT, (title, compress_notes(notes), bool(notes), priority, to_epoch(due_date),
+                                                   _now_epoch(), uuid.uuid4().hex))
+        task_id = cur.lastrowid
+        self._changed()
+        self._notes.put(task_id, notes)
+        repository._notify("add", task_id, _snapshot(self._get(task_id)))
+        return task_id
+
+    def get_task(self, task_id: int) -> Optional[TaskRow]:
+        row = self._get(task_id)
+        if row is not None:
+            self._notes.put(task_id, row.notes)
+        return row
+
+    def get_task_notes(self, task_id: int) -> Optional[str]:
+        notes = self._notes.get(task_id, repository._MISSING)
+        if notes is not repository._MISSING:
+            return notes
+        r = self._conn.execute(_SQL_NOTES, (task_id,)).fetchone()
+        notes = decompress_notes(r[0]) if r else None
+        self._notes.put(task_id, notes)
+        return notes
+
+    def _query(self, key: tuple, sql: str, params: tuple = ()) -> List[TaskRow]:
+        version = self._version()
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        rows = [_from_db(r) for r in self._conn.execute(sql, params)]
+        self._cache[key] = (version, rows)
+        return rows
+
+    def list_tasks(self, show_all: bool = True) -> List[TaskRow]:
+        if show_all:
+            return self._query(("all",), _SQL_LIST_ALL)
+        return self._query(("pending",), _SQL_LIST_PENDING)
+
+    def list_due_between(self, start, end, include_done: bool = False) -> List[TaskRow]:
+        sql = _due_sql(start is not None, end is not None, include_done)
+        params = tuple(to_epoch(v) for v in (start, end) if v is not None)
+        return [_from_db(r) for r in self._conn.execute(sql, params)]
+
+    def list_upcoming_due(self, after: Optional[datetime] = None) -> List[tuple]:
+        after = after or datetime.now(timezone.utc)
+        return [(tid, title, _datetime(due)) for tid, title, due in self._conn.execute(_SQL_UPCOMING, (to_epoch(after),))]
+
+    def set_done(self, task_id: int, done: bool = True) -> bool:
+        with self._conn:
+            found = self._conn.execute(_SQL_SET_DONE, (bool(done), _now_epoch(), task_id)).rowcount > 0
+        if found:
+            self._changed()
+            repository._notify("update", task_id, _snapshot(self._get(task_id)))
+        return found
+
+    def update_task(self, task_id: int, **fields) -> bool:
+        values = {k: v for k, v in fields.items() if k in EDITABLE_FIELDS}
+        if "due_date" in values:
+            values["due_date"] = to_epoch(values["due_date"])
+        if "done" in values:
+            values["done"] = bool(values["done"])
+        if "notes" in values:
+            values["has_notes"] = bool(values["notes"])
+            values["notes"] = compress_notes(values["notes"])
+        values["updated_at"] = _now_epoch()
+        names = sorted(values)
+        sql = f"UPDATE tasks SET {', '.join(f'{k} = ?' for k in names)} WHERE id = ? AND deleted_at IS NULL"
+        with self._conn:
+            found = self._conn.execute(sql, [values[k] for k in names] + [task_id]).rowcount > 0
+        if not found:
+            return False
+        self._changed()
+        if "notes" in values:
+            self._notes.discard(task_id)
+        repository._notify("update", task_id, _snapshot(self._get(task_id)))
+        return True
+
+    def delete_task(self, task_id: int) -> bool:
+        with self._conn:
+            found = self._conn.execute(_SQL_DELETE, (_now_epoch(), task_id)).rowcount > 0
+        if not found:
+            return False
+        self._changed()
+        self._notes.discard(task_id)
+        repository._notify("delete", task_id)
+        return True
+
+    def restore_task(self, task_id: int) -> bool:
+        with self._conn:
+            found = self._conn.execute(_SQL_RESTORE, (_now_epoch(), task_id)).rowcount > 0
+        if found:
+            self._changed()
+            repository._notify("update", task_id, _snapshot(self._get(task_id)))
+        return found
+
+    def close(self):
+        self._conn.close()
+
+
+def _list_key(row: TaskRow) -> tuple:
+    return (row.done, -(row.priority or 0), to_epoch(row.created_at), row.id)
+
+
+class MemoryStore:
+    """Tasks in dicts. Nothing is persisted; ids restart at 1 for every instance.
+
+    `_order` is a sorted array of list-order keys, so a write moves one entry
+    with two binary searches instead of re-sorting every task.
+    """
+
+    def __init__(self):
+        self._rows: Dict[int, TaskRow] = {}
+        self._deleted: Dict[int, TaskRow] = {}
+        self._notes: Dict[int, Optional[str]] = {}
+        self._order: List[tuple] = []
+        self._next_id = 1
+        self._lists: Dict[bool, List[TaskRow]] = {}
+
+    def _remove_key(self, row: TaskRow):
+        key = _list_key(row)
+        i = bisect_left(self._order, key)
+        if i < len(self._order) and self._order[i] == key:
+            del self._order[i]
+
+    def _put(self, row: TaskRow):
+        old = self._rows.get(row.id)
+        if old is not None:
+            self._remove_key(old)
+        self._rows[row.id] = row
+        insort(self._order, _list_key(row))
+        self._lists.clear()
+
+    def add_task(self, title: str, notes: Optional[str] = None, priority: int = 0, due_date=None) -> int:
+        task_id = self._next_id
+        self._next_id += 1
+        # round-trip through epoch seconds so values behave exactly like stored ones
+        row = TaskRow(task_id, title, False, priority, from_epoch(to_epoch(due_date)), from_epoch(_now_epoch()),
+                      None, bool(notes), uuid.uuid4().hex)
+        self._put(row)
+        self._notes[task_id] = notes
+        repository._notify("add", task_id, _snapshot(row))
+        return task_id
+
+    def get_task(self, task_id: int) -> Optional[TaskRow]:
+        row = self._rows.get(task_id)
+        return row._replace(notes=self._notes.get(task_id)) if row else None
+
+    def get_task_notes(self, task_id: int) -> Optional[str]:
+        return self._notes.get(task_id)
+
+    def list_tasks(self, show_all: bool = True) -> List[TaskRow]:
+        rows = self._lists.get(show_all)
+        if rows is None:
+            order = self._order if show_all else self._order[:bisect_left(self._order, (True,))]
+            rows = [self._rows[key[-1]] for key in order]
+            self._lists[show_all] = rows
+        return rows
+
+    def list_due_between(self, start, end, include_done: bool = False) -> List[TaskRow]:
+        rows = [
+            r for r in self._rows.values()
+            if r.due_date is not None and (include_done or not r.done)
+            and (start is None or r.due_date >= start) and (end is None or r.due_date < end)
+        ]
+        return sorted(rows, key=lambda r: (r.due_date, -(r.priority or 0), r.id))
+
+    def list_upcoming_due(self, after: Optional[datetime] = None) -> List[tuple]:
+        after = after or datetime.now(timezone.utc)
+        return [(r.id, r.title, r.due_date) for r in self.list_due_between(after, None)]
+
+    def set_done(self, task_id: int, done: bool = True) -> bool:
+        return self.update_task(task_id, done=done)
+
+    def update_task(self, task_id: int, **fields) -> bool:
+        row = self._rows.get(task_id)
+        if row is None:
+            return False
+        values = {k: v for k, v in fields.items() if k in EDITABLE_FIELDS and k != "notes"}
+        if "due_date" in values:
+            values["due_date"] = from_epoch(to_epoch(values["due_date"]))
+        if "done" in values:
+            values["done"] = bool(values["done"])
+        if "notes" in fields:
+            self._notes[task_id] = fields["notes"]
+            values["has_notes"] = bool(fields["notes"])
+        row = row._replace(updated_at=from_epoch(_now_epoch()), **values)
+        self._put(row)
+        repository._notify("update", task_id, _snapshot(row))
+        return True
+
+    def delete_task(self, task_id: int) -> bool:
+        row = self._rows.pop(task_id, None)
+        if row is None:
+            return False
+        self._remove_key(row)
+        self._deleted[task_id] = row
+        self._lists.clear()
+        repository._notify("delete", task_id)
+        return True
+
+    def restore_task(self, task_id: int) -> bool:
+        row = self._deleted.pop(task_id, None)
+        if row is None:
+            return False
+        row = row._replace(updated_at=from_epoch(_now_epoch()))
+        self._put(row)
+        repository._notify("update", task_id, _snapshot(row))
+        return True
+
+    def close(self):
+        pass
+
+
+def default_backend() -> str:
+    """Backend named by the TODO_BACKEND environment variable, else the ORM."""
+    return os.environ.get("TODO_BACKEND") or DEFAULT_BACKEND
+
+
+def open_store(backend: Optional[str] = None, db_path: Optional[str] = None,
+               state: Optional[repository.RepositoryState] = None, persistent: bool = False) -> TaskStore:
+    """Create the store for `backend` (default: default_backend()) on `db_path` / `state`.
+
+    With persistent=True only PERSISTENT_BACKENDS are accepted.
+    """
+    backend = backend or default_backend()
+    if persistent and backend not in PERSISTENT_BACKENDS:
+        raise ValueError(
+            f"storage backend {backend!r} does not write to the database "
+            f"(expected one of {', '.join(PERSISTENT_BACKENDS)})"
+        )
+    if backend == "sqlalchemy":
+        return SQLAlchemyStore(state)
+    if backend == "sqlite":
+        if not db_path:
+            raise ValueError("the sqlite backend needs a database path")
+        return SQLiteStore(db_path, state=state)
+    if backend == "memory":
+        return MemoryStore()
+    raise ValueError(f"unknown storage backend: {backend!r} (expected one of {', '.join(BACKENDS)})")
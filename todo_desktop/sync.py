@@ -0,0 +1,345 @@
+"""Delta sync between databases through the change log.
+
+Every write to `tasks` / `task_tags` appends (seq, uid, op) to `change_log`
+via triggers. A sync exchanges only the tasks changed since the last cursor
+on each side: the client pushes its local changes, then pulls the server's.
+Conflicts are resolved per task by `updated_at` (falling back to
+`created_at`), newest wins. Timestamps have one-second resolution, so ties
+are broken by comparing a digest of both versions, which every database
+decides the same way. Deletes carry the time of deletion and lose against a
+later local edit. A task in the trash is sent as a delete, and a received
+delete moves the local task to the trash; restoring it later is an ordinary
+(newer) upsert.
+"""
+import hashlib
+import json
+import urllib.request
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+
+from . import repository
+from .models import ChangeLog, SyncState, Tag, Task, task_tags
+
+BATCH = 1000
+
+
+def _epoch(dt) -> Optional[int]:
+    return int(dt.timestamp()) if dt else None
+
+
+def _state(state: Optional[repository.RepositoryState]) -> repository.RepositoryState:
+    return state or repository._current()
+
+
+def export_changes(since: int = 0, limit: int = BATCH, state: Optional[repository.RepositoryState] = None,
+                   until: Optional[int] = None) -> Tuple[List[dict], int, bool]:
+    """Changes after log position `since` (up to `until`, if given): (changes, new cursor, has_more).
+
+    Several log entries for the same task collapse into its current state.
+    """
+    s = _state(state).session()
+    try:
+        q = select(ChangeLog.seq, ChangeLog.uid, ChangeLog.op, ChangeLog.changed_at).where(ChangeLog.seq > since)
+        if until is not None:
+            q = q.where(ChangeLog.seq <= until)
+        log = s.execute(q.order_by(ChangeLog.seq).limit(limit + 1)).all()
+        has_more = len(log) > limit
+        log = log[:limit]
+        if not log:
+            return [], since, False
+        latest = {}
+        for _, uid, op, changed_at in log:
+            latest.pop(uid, None)  # keep uids ordered by their last change
+            latest[uid] = (op, changed_at)
+
+        upserts = [uid for uid, (op, _) in latest.items() if op == "upsert"]
+        rows = _load_upserts(s.connection(), Task.uid.in_(upserts)) if upserts else {}
+
+        changes = []
+        for uid, (op, changed_at) in latest.items():
+            if op == "delete":
+                changes.append({"uid": uid, "op": "delete", "changed_at": changed_at})
+            elif uid in rows:
+                ch = rows[uid]
+                if ch["deleted_at"] is not None:
+                    ch = {"uid": uid, "op": "delete", "changed_at": ch["deleted_at"]}
+                changes.append(ch)
+            # else: deleted again after this page; the delete comes with a later page
+        return changes, log[-1].seq, has_more
+    finally:
+        s.close()
+
+
+def _load_upserts(conn, condition) -> dict:
+    """Upsert change dicts (current row state plus tags) for the tasks matching `condition`, by uid."""
+    rows = conn.execute(
+        select(Task.id, Task.uid, Task.title, Task.notes, Task.done, Task.priority,
+               Task.due_date, Task.created_at, Task.updated_at, Task.deleted_at).where(condition)
+    ).all()
+    tags = {}
+    ids = [t.id for t in rows]
+    if ids:
+        for task_id, name in conn.execute(
+            select(task_tags.c.task_id, Tag.name)
+            .join(Tag, Tag.id == task_tags.c.tag_id)
+            .where(task_tags.c.task_id.in_(ids))
+            .order_by(Tag.name)
+        ):
+            tags.setdefault(task_id, []).append(name)
+    return {
+        t.uid: {
+            "uid": t.uid,
+            "op": "upsert",
+            "title": t.title,
+            "notes": t.notes,
+            "done": bool(t.done),
+            "priority": t.priority,
+            "due_date": _epoch(t.due_date),
+            "created_at": _epoch(t.created_at),
+            "updated_at": _epoch(t.updated_at),
+            "deleted_at": _epoch(t.deleted_at),
+            "tags": tags.get(t.id, []),
+        }
+        for t in rows
+    }
+
+
+def _digest(change: dict) -> str:
+    fields = {k: change.get(k) for k in ("title", "notes", "done", "priority", "due_date", "tags")}
+    return hashlib.sha1(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _remote_wins(conn, local, local_ts: int, change: dict) -> bool:
+    remote_ts = change.get("updated_at") or change.get("created_at") or 0
+    if remote_ts != local_ts:
+        return remote_ts > local_ts
+    current = _load_upserts(conn, Task.id == local.id).get(change["uid"])
+    return current is not None and _digest(change) > _digest(current)
+
+
+def _tag_ids(conn, names: List[str]) -> List[int]:
+    ids = []
+    for name in names:
+        tag_id = conn.execute(select(Tag.id).where(Tag.name == name)).scalar()
+        if tag_id is None:
+            tag_id = conn.execute(insert(Tag).values(name=name)).inserted_primary_key[0]
+        ids.append(tag_id)
+    return ids
+
+
+def apply_changes(changes: List[dict], record: bool = True,
+                  state: Optional[repository.RepositoryState] = None) -> int:
+    """Apply changes exported by another database in one transaction; returns how many won.
+
+    With record=False the log entries written by the triggers while applying
+    are removed again, so a client does not push back what it just pulled.
+    """
+    return _apply_changes(changes, record, state)[0]
+
+
+def apply_pushed_changes(changes: List[dict],
+                         state: Optional[repository.RepositoryState] = None) -> Tuple[int, Tuple[int, int]]:
+    """apply_changes() for changes pushed by a client: also returns the log range (start, end] it wrote.
+
+    The range holds only this push (the transaction has the write lock), so
+    the pushing client can skip it when pulling instead of downloading its
+    own changes again.
+    """
+    applied, before, after = _apply_changes(changes, True, state)
+    return applied, (before, after)
+
+
+def _apply_changes(changes: List[dict], record: bool,
+                   state: Optional[repository.RepositoryState]) -> Tuple[int, int, int]:
+    st = _state(state)
+    s = st.session()
+    applied = []
+    try:
+        conn = s.connection()
+        # write first so this transaction holds SQLite's write lock: no other connection
+        # can then add log entries between reading `before` and the end of the apply
+        conn.exec_driver_sql(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES ('last_applied_at', CAST(strftime('%s', 'now') AS TEXT))"
+        )
+        before = conn.execute(select(func.max(ChangeLog.seq))).scalar() or 0
+        for ch in changes:
+            uid = ch.get("uid")
+            if not uid:
+                continue
+            local = conn.execute(
+                select(Task.id, Task.updated_at, Task.created_at, Task.deleted_at).where(Task.uid == uid)
+            ).first()
+            local_ts = (_epoch(local.updated_at) or _epoch(local.created_at) or 0) if local else None
+            if ch.get("op") == "delete":
+                changed_at = ch.get("changed_at") or 0
+                if local is not None and local.deleted_at is None and local_ts <= changed_at:
+                    conn.execute(
+                        update(Task).where(Task.id == local.id).values(deleted_at=changed_at, updated_at=changed_at)
+                    )
+                    applied.append(("delete", local.id))
+                continue
+            if local is not None and not _remote_wins(conn, local, local_ts, ch):
+                continue
+            values = {
+                "title": ch.get("title") or "",
+                "notes": ch.get("notes"),
+                "has_notes": bool(ch.get("notes")),
+                "done": bool(ch.get("done")),
+                "priority": ch.get("priority") or 0,
+                "due_date": ch.get("due_date"),
+                "created_at": ch.get("created_at"),
+                "updated_at": ch.get("updated_at"),
+                "deleted_at": None,
+            }
+            if local is None:
+                task_id = conn.execute(insert(Task).values(uid=uid, **values)).inserted_primary_key[0]
+                applied.append(("add", task_id))
+            else:
+                task_id = local.id
+                conn.execute(update(Task).where(Task.id == task_id).values(**values))
+                applied.append(("update", task_id))
+            conn.execute(delete(task_tags).where(task_tags.c.task_id == task_id))
+            tag_ids = _tag_ids(conn, repository._normalize_tags(ch.get("tags") or []))
+            if tag_ids:
+                conn.execute(insert(task_tags), [{"task_id": task_id, "tag_id": tid} for tid in tag_ids])
+        if record:
+            after = conn.execute(select(func.max(ChangeLog.seq))).scalar() or before
+        else:
+            conn.execute(delete(ChangeLog).where(ChangeLog.seq > before))
+            after = before
+        s.commit()
+    finally:
+        s.close()
+    if applied:
+        st.invalidate()
+        st.notes_cache.clear()
+        for op, task_id in applied:
+            repository._notify(op, task_id, None if op == "delete" else _task_values(st, task_id))
+    return len(applied), before, after
+
+
+def _task_values(st: repository.RepositoryState, task_id: int) -> Optional[dict]:
+    s = st.session()
+    try:
+        t = s.get(Task, task_id)
+        return repository._snapshot(t) if t else None
+    finally:
+        s.close()
+
+
+def last_change_seq(state: Optional[repository.RepositoryState] = None) -> int:
+    """Highest change_log seq ever handed out, 0 for an empty log.
+
+    Every write to tasks / task_tags from any connection bumps it through the
+    triggers. Unlike max(seq) it never goes back when log entries are removed
+    (apply_changes(record=False)), so equal values mean unchanged data.
+    """
+    s = _state(state).session()
+    try:
+        row = s.connection().exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").first()
+        return row[0] if row else 0
+    finally:
+        s.close()
+
+
+def get_sync_value(key: str, default: Optional[str] = None,
+                   state: Optional[repository.RepositoryState] = None) -> Optional[str]:
+    s = _state(state).session()
+    try:
+        value = s.execute(select(SyncState.value).where(SyncState.key == key)).scalar()
+        return default if value is None else value
+    finally:
+        s.close()
+
+
+def set_sync_value(key: str, value: str, state: Optional[repository.RepositoryState] = None):
+    s = _state(state).session()
+    try:
+        row = s.get(SyncState, key)
+        if row is None:
+            s.add(SyncState(key=key, value=value))
+        else:
+            row.value = value
+        s.commit()
+    finally:
+        s.close()
+
+
+class SyncClient:
+    """Synchronises the local database with a `python -m todo_desktop serve` instance."""
+
+    def __init__(self, base_url: str, state: Optional[repository.RepositoryState] = None, timeout: float = 30):
+        self.base_url = base_url.rstrip("/")
+        self.state = state
+        self.timeout = timeout
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def _http(self, method: str, path: str, payload=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            body = resp.read()
+        self.bytes_sent += len(data or b"")
+        self.bytes_received += len(body)
+        return json.loads(body)
+
+    def sync(self) -> dict:
+        """Push local changes, then pull remote ones. Returns counts and bytes transferred."""
+        push_key = f"push_cursor:{self.base_url}"
+        self.bytes_sent = self.bytes_received = 0
+        pushed = pulled = 0
+        # server log ranges written by our own pushes: pulling them would only download
+        # what we just sent
+        own_ranges = []
+
+        cursor = int(get_sync_value(push_key, "0", state=self.state))
+        while True:
+            changes, new_cursor, has_more = export_changes(cursor, state=self.state)
+            if changes:
+                result = self._http("POST", "/sync/changes", {"changes": changes})
+                if result.get("log"):
+                    own_ranges.append(tuple(result["log"]))
+                pushed += len(changes)
+            if new_cursor != cursor:
+                cursor = new_cursor
+                set_sync_value(push_key, str(cursor), state=self.state)
+            if not has_more:
+                break
+
+        for start, end in own_ranges:
+            pulled += self._pull(until=start)
+            self._set_pull_cursor(end)
+        pulled += self._pull()
+
+        return {
+            "pushed": pushed,
+            "pulled": pulled,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+    def _pull_cursor(self) -> int:
+        return int(get_sync_value(f"pull_cursor:{self.base_url}", "0", state=self.state))
+
+    def _set_pull_cursor(self, cursor: int):
+        if cursor > self._pull_cursor():
+            set_sync_value(f"pull_cursor:{self.base_url}", str(cursor), state=self.state)
+
+    def _pull(self, until: Optional[int] = None) -> int:
+        """Apply the server's changes after the pull cursor (up to log position `until`)."""
+        cursor = self._pull_cursor()
+        pulled = 0
+        while until is None or cursor < until:
+            path = f"/sync/changes?since={cursor}&limit={BATCH}" + (f"&until={until}" if until is not None else "")
+            page = self._http("GET", path)
+            if page["changes"]:
+                pulled += apply_changes(page["changes"], record=False, state=self.state)
+            if page["cursor"] != cursor:
+                cursor = page["cursor"]
+                self._set_pull_cursor(cursor)
+            if not page["has_more"]:
+                break
+        return pulled
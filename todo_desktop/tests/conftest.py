@@ -0,0 +1,62 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from todo_desktop import models, repository
+from todo_desktop.server import TaskServer
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """A clock for code that takes a `clock` callable; tests set and advance `clock.now`."""
+    return FakeClock(0.0)
+
+
+@pytest.fixture(autouse=True)
+def _reset_repository():
+    yield
+    # leave the next test with the plain init_db() setup, whatever this one activated
+    repository.activate()
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Initialise a fresh database for a test, with empty repository caches."""
+    dbp = tmp_path / "td.db"
+    engine = models.init_db(str(dbp))
+    repository.activate()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def server(tmp_path):
+    """A TaskServer on a free port, its event loop running on a background thread."""
+    loop = asyncio.new_event_loop()
+    srv = TaskServer(str(tmp_path / "server.db"), port=0)
+    loop.run_until_complete(srv.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield srv
+    asyncio.run_coroutine_threadsafe(srv.close(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+    loop.close()
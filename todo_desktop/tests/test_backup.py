@@ -0,0 +1,78 @@
+import sqlite3
+import time
+from datetime import datetime
+
+from todo_desktop import repository
+from todo_desktop.backup import BackupJob, backup_database, list_snapshots, snapshot
+from todo_desktop.cli import main as cli_main
+
+
+def _titles(path):
+    con = sqlite3.connect(str(path))
+    try:
+        return sorted(r[0] for r in con.execute("SELECT title FROM tasks"))
+    finally:
+        con.close()
+
+
+def test_backup_copies_in_steps(db, tmp_path):
+    for i in range(300):
+        repository.add_task(title=f"task {i}", notes="x" * 500)
+    dest = tmp_path / "copy.db"
+    backup_database(db, dest, pages=4, pause=0)
+    assert len(_titles(dest)) == 300
+
+
+def test_snapshot_rotation_and_compaction(db, tmp_path):
+    repository.add_task(title="a")
+    backup_dir = tmp_path / "backups"
+    for minute in range(4):
+        snapshot(db, backup_dir, keep=2, now=datetime(2030, 1, 1, 12, minute))
+    snaps = list_snapshots(db, backup_dir)
+    assert [p.name for p in snaps] == ["td-20300101-120200.db", "td-20300101-120300.db"]
+    compacted = snapshot(db, backup_dir, keep=0, compact=True, now=datetime(2030, 1, 1, 12, 3))
+    assert compacted.endswith("td-20300101-120300-1.db")
+    assert _titles(compacted) == ["a"]
+    assert list_snapshots(db, backup_dir)[-1].name == "td-20300101-120300-1.db"
+
+
+def test_rotation_ignores_workspaces_with_a_common_prefix(db, tmp_path):
+    # the db fixture is "td.db"; a workspace called "td-old" shares the "td-" prefix
+    backup_dir = tmp_path / "backups"
+    backup_dir.mkdir()
+    other = backup_dir / "td-old-20300101-120000.db"
+    other.write_bytes(b"")
+    for minute in range(3):
+        snapshot(db, backup_dir, keep=1, now=datetime(2030, 1, 1, 12, minute))
+    assert [p.name for p in list_snapshots(db, backup_dir)] == ["td-20300101-120200.db"]
+    assert other.exists()
+
+
+def test_backup_job_and_cli(db, tmp_path, capsys):
+    repository.add_task(title="a")
+    job = BackupJob(db, tmp_path / "job", keep=1)
+    assert job.run_now() and job.last_error is None
+
+    assert cli_main(["backup", "--db", str(tmp_path / "td.db"), "--dir", str(tmp_path / "cli")]) == 0
+    out = capsys.readouterr().out.strip()
+    assert _titles(out) == ["a"]
+
+
+def test_backup_job_snapshots_soon_after_start_when_due(db, tmp_path):
+    job = BackupJob(db, tmp_path / "auto", interval=0.3, keep=0, startup_delay=0.05)
+    job.start()
+    try:
+        deadline = time.monotonic() + 5
+        while len(list_snapshots(db, tmp_path / "auto")) < 2 and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        job.stop(5)
+    assert len(list_snapshots(db, tmp_path / "auto")) >= 2 and job.last_error is None
+
+    # a recent snapshot exists: the next one waits for the rest of the interval
+    job = BackupJob(db, tmp_path / "auto", interval=60, keep=0, startup_delay=0.05)
+    assert job._first_delay() > 50
+    job.start()
+    time.sleep(0.2)
+    job.stop(5)
+    assert job.last_path is None
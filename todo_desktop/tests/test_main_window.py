@@ -0,0 +1,39 @@
+import pytest
+
+from todo_desktop import repository
+
+
+@pytest.fixture
+def window(tmp_path, qapp):
+    from todo_desktop.ui.main_window import MainWindow
+
+    w = MainWindow(db_path=str(tmp_path / "win.db"))
+    yield w
+    w.close()
+    w.workspaces.close_all()
+
+
+def test_toggle_and_delete_do_not_load_notes(window, monkeypatch):
+    from todo_desktop.ui import main_window
+
+    tid = window.store.add_task(title="log", notes="line\n" * 50_000)
+    cache = window.workspace.state.notes_cache
+    cache.discard(tid)
+    window.refresh()
+
+    window.on_status_click(window.model.index(0, 1))
+    assert window.model.is_done(0) is True
+    assert cache.get(tid, repository._MISSING) is repository._MISSING
+
+    class ConfirmingMessageBox:
+        StandardButton = main_window.QMessageBox.StandardButton
+
+        @staticmethod
+        def question(*args, **kwargs):
+            return main_window.QMessageBox.StandardButton.Yes
+
+    monkeypatch.setattr(main_window, "QMessageBox", ConfirmingMessageBox)
+    window.table.selectRow(0)
+    window.on_delete()
+    assert window.model.rowCount() == 0 and window.completed_count == 0
+    assert cache.get(tid, repository._MISSING) is repository._MISSING
@@ -0,0 +1,96 @@
+import sqlite3
+
+from todo_desktop import maintenance, models, repository
+from todo_desktop.cli import main as cli_main
+from todo_desktop.stores import SQLiteStore
+
+
+def test_recompress_notes_in_batches(db):
+    path = db.url.database
+    con = sqlite3.connect(path)
+    for i in range(5):
+        con.execute("INSERT INTO tasks (title, notes, has_notes, done, uid) VALUES (?, ?, 1, 0, ?)",
+                    (f"t{i}", f"{i} " * 5000, f"uid{i}"))
+    con.commit()
+    con.close()
+    before = maintenance.database_stats(db)
+    assert maintenance.recompress_notes(db, batch_size=2) == 5
+    assert maintenance.recompress_notes(db) == 0
+    after = maintenance.database_stats(db)
+    assert after["tasks_with_notes"] == 5
+    assert after["used_bytes"] <= before["used_bytes"]
+    assert maintenance.measure_notes_read(db) >= 0
+    tasks = repository.list_tasks()
+    assert repository.get_task_notes(tasks[0].id) == "0 " * 5000
+
+    store = SQLiteStore(path)
+    try:
+        assert store.get_task(tasks[1].id).notes == "1 " * 5000
+        tid = store.add_task("new", notes="x" * 10000)
+        assert store.get_task_notes(tid) == "x" * 10000
+    finally:
+        store.close()
+    con = sqlite3.connect(path)
+    assert con.execute("SELECT DISTINCT typeof(notes) FROM tasks").fetchall() == [("blob",)]
+    con.close()
+
+
+def test_compress_notes_cli_reports_uncompressed_state_first(tmp_path, capsys):
+    dbp = str(tmp_path / "old.db")
+    models.create_db_engine(dbp).dispose()
+    con = sqlite3.connect(dbp)
+    con.executemany("INSERT INTO tasks (title, notes, has_notes, done, uid) VALUES (?, ?, 1, 0, ?)",
+                    [(f"t{i}", f"log line {i}\n" * 2000, f"uid{i}") for i in range(20)])
+    con.execute("PRAGMA user_version = 4")  # a database from an older version
+    con.commit()
+    con.close()
+    assert cli_main(["compress-notes", "--db", dbp, "--vacuum"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "compressed 20 notes"
+    before, after = (int(v.replace(",", "")) for v in lines[1].split()[2:5:2])
+    assert after < before / 5
+
+
+def test_purge_vacuum_and_optimize(db):
+    ids = [repository.add_task(title=f"t{i}", notes="n" * 3000) for i in range(60)]
+    repository.set_task_tags(ids[0], ["x"])
+    for tid in ids[:50]:
+        repository.delete_task(tid)
+    with db.begin() as conn:
+        # make half of the tombstones old enough to purge
+        conn.exec_driver_sql("UPDATE tasks SET deleted_at = deleted_at - 30 * 86400 WHERE id <= ?", (ids[24],))
+    calls = []
+    assert maintenance.purge_deleted(db, batch_size=10, should_continue=lambda: calls.append(1) or len(calls) < 2) == 20
+    assert maintenance.purge_deleted(db, batch_size=10) == 5
+    with db.connect() as conn:
+        assert conn.exec_driver_sql("SELECT count(*) FROM tasks").scalar() == 35
+        assert conn.exec_driver_sql("SELECT count(*) FROM task_tags").scalar() == 0
+        assert conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+    assert not repository.restore_task(ids[0])
+    assert repository.restore_task(ids[30])
+
+    assert maintenance.incremental_vacuum(db) > 0
+    assert maintenance.optimize(db) == "ANALYZE"
+    assert maintenance.optimize(db) == "PRAGMA optimize"
+
+
+def test_idle_maintenance_waits_for_idle_user(db, qapp, clock):
+    from PySide6.QtCore import QEvent
+    from PySide6.QtGui import QKeyEvent
+    from PySide6.QtCore import Qt
+    from todo_desktop.idle_maintenance import IdleMaintenance
+
+    clock.now = 1000.0
+    job = IdleMaintenance(db, idle_secs=60, interval=3600, clock=clock)
+    assert not job.check()  # the user was active just now
+    clock.now += 61
+    job.eventFilter(None, QKeyEvent(QEvent.KeyPress, Qt.Key_A, Qt.NoModifier))
+    assert not job.check()
+    clock.now += 61
+    assert job.check()
+    job._thread.join(10)
+    assert job.last_error is None and job.last_result["complete"]
+    assert not job.check()  # ran recently
+    clock.now += 3600
+    assert job.check()
+    job.stop(10)
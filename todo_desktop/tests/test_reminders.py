@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from todo_desktop import repository
+from todo_desktop.reminders import ReminderQueue, ReminderScheduler
+
+T0 = datetime(2030, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def _at(offset: float) -> datetime:
+    return datetime.fromtimestamp(T0 + offset, timezone.utc)
+
+
+def test_queue_orders_and_reschedules_lazily():
+    q = ReminderQueue()
+    q.load([(1, 30.0, "a"), (2, 10.0, "b"), (3, 20.0, "c")])
+    assert q.peek() == 10.0
+    q.set(2, 40.0, "b")
+    q.discard(3)
+    assert q.peek() == 30.0
+    assert q.pop_due(35.0) == [(1, "a", 30.0)]
+    assert len(q) == 1 and q.peek() == 40.0
+
+
+@pytest.fixture
+def scheduler(db, qapp, clock):
+    clock.now = T0
+    sched = ReminderScheduler(clock=clock)
+    fired = []
+    sched.reminder_due.connect(lambda tid, title: fired.append((tid, title)))
+    yield sched, clock, fired
+    sched.stop()
+
+
+def test_scheduler_arms_for_next_deadline(scheduler):
+    sched, clock, fired = scheduler
+    # overdue since before today, so not caught up on start
+    repository.add_task(title="past", due_date=repository.start_of_day(_at(0)) - timedelta(minutes=1))
+    late = repository.add_task(title="late", due_date=_at(600))
+    sched.start()
+    assert len(sched.queue) == 1
+    assert sched.next_interval_ms() == 600_000
+
+    soon = repository.add_task(title="soon", due_date=_at(5))
+    assert sched.next_interval_ms() == 5_000
+
+    clock.now = T0 + 5
+    sched._on_timeout()
+    assert fired == [(soon, "soon")]
+    assert sched.next_interval_ms() == 595_000
+
+    repository.set_done(late, True)
+    assert sched.next_interval_ms() is None
+
+
+def test_scheduler_follows_updates_and_deletes(scheduler):
+    sched, clock, fired = scheduler
+    sched.start()
+    tid = repository.add_task(title="t", due_date=_at(100))
+    repository.update_task(tid, due_date=_at(7200))
+    assert sched.next_interval_ms() == ReminderScheduler.MAX_INTERVAL_MS
+
+    clock.now = T0 + 3600
+    sched._on_timeout()
+    assert fired == []
+    assert sched.next_interval_ms() == 3_600_000
+
+    repository.delete_task(tid)
+    assert sched.next_interval_ms() is None
+    assert len(sched.queue) == 0
+
+
+def test_scheduler_catches_up_on_tasks_due_today(db, qapp, clock):
+    # started at 10:00 local time; the dialog stores due dates as local midnight
+    midnight = repository.start_of_day(datetime.fromtimestamp(T0, timezone.utc))
+    clock.now = midnight.timestamp() + 10 * 3600
+    yesterday = repository.add_task(title="yesterday", due_date=midnight - timedelta(days=1))
+    today = repository.add_task(title="today", due_date=midnight)
+    fired = []
+    sched = ReminderScheduler(clock=clock)
+    sched.reminder_due.connect(lambda tid, title: fired.append(tid))
+    try:
+        sched.start()
+        assert sched.next_interval_ms() == 0
+        sched._on_timeout()
+        assert fired == [today] and yesterday not in fired
+
+        # a restart later the same day does not remind again
+        clock.now += 3600
+        sched.reload()
+        assert sched.next_interval_ms() is None
+
+        # created for "today", or moved to today, while the app runs: reminded right away,
+        # even though an earlier reminder already moved the delivery mark past midnight
+        added = repository.add_task(title="added", due_date=midnight)
+        repository.update_task(yesterday, due_date=midnight)
+        assert sched.next_interval_ms() == 0
+        sched._on_timeout()
+        assert fired[0] == today and sorted(fired[1:]) == sorted([added, yesterday])
+
+        # editing them again does not repeat the reminder
+        repository.update_task(added, title="added (edited)")
+        assert sched.next_interval_ms() is None
+    finally:
+        sched.stop()
@@ -0,0 +1,192 @@
+from datetime import datetime, timedelta, timezone
+import sqlite3
+
+from sqlalchemy.orm.attributes import instance_state
+
+from todo_desktop import maintenance, models, repository
+
+
+def test_list_tasks_defers_notes(db):
+    tid = repository.add_task(title="log", notes="x" * 10000)
+    other = repository.add_task(title="plain")
+    tasks = {t.id: t for t in repository.list_tasks(show_all=True)}
+    assert "notes" in instance_state(tasks[tid]).unloaded
+    assert tasks[tid].has_notes and not tasks[other].has_notes
+    repository.activate()  # drop cached notes so they are read back from the database
+    assert repository.get_task_notes(tid) == "x" * 10000
+    assert repository.get_task_notes(other) is None
+
+
+def test_update_notes_refreshes_flag_and_cache(db):
+    tid = repository.add_task(title="t", notes="old")
+    assert repository.get_task_notes(tid) == "old"
+    repository.update_task(tid, notes="")
+    assert repository.get_task_notes(tid) == ""
+    assert not repository.get_task(tid).has_notes
+
+
+def test_notes_cache_evicts_by_size():
+    cache = repository._NotesCache(max_chars=10)
+    cache.put(1, "aaaa")
+    cache.put(2, "bbbb")
+    cache.get(1)
+    cache.put(3, "cccc")
+    assert cache.get(2) is None
+    assert cache.get(1) == "aaaa" and cache.get(3) == "cccc"
+    cache.put(4, "d" * 11)
+    assert cache.get(4) is None
+
+
+def test_migration_adds_has_notes(tmp_path):
+    dbp = tmp_path / "old.db"
+    con = sqlite3.connect(dbp)
+    con.execute(
+        "CREATE TABLE tasks (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL, notes TEXT, done BOOLEAN NOT NULL, "
+        "priority INTEGER, due_date DATETIME, created_at DATETIME, updated_at DATETIME)"
+    )
+    con.execute("INSERT INTO tasks (title, notes, done, priority) VALUES ('a', 'n', 0, 0), ('b', NULL, 0, 0)")
+    con.commit()
+    con.close()
+    models.init_db(str(dbp))
+    repository.activate()
+    flags = {t.title: t.has_notes for t in repository.list_tasks(show_all=True)}
+    assert flags == {"a": True, "b": False}
+
+
+def test_timestamps_stored_as_epoch_integers(db):
+    due = datetime(2030, 5, 17, 12, 30, tzinfo=timezone.utc)
+    tid = repository.add_task(title="t", due_date=due)
+    naive = repository.add_task(title="n", due_date=datetime(2030, 5, 18))
+    with db.connect() as conn:
+        kinds = conn.exec_driver_sql("SELECT DISTINCT typeof(due_date), typeof(created_at) FROM tasks").fetchall()
+    assert kinds == [("integer", "integer")]
+    t = repository.get_task(tid)
+    assert t.due_date == due and t.due_date.tzinfo is not None
+    assert repository.get_task(naive).due_date == datetime(2030, 5, 18).astimezone()
+
+
+def test_migration_converts_iso_timestamps(tmp_path):
+    dbp = tmp_path / "old.db"
+    con = sqlite3.connect(dbp)
+    con.execute(
+        "CREATE TABLE tasks (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL, notes TEXT, done BOOLEAN NOT NULL, "
+        "priority INTEGER, due_date DATETIME, created_at DATETIME, updated_at DATETIME)"
+    )
+    con.execute(
+        "INSERT INTO tasks (title, done, due_date, created_at) "
+        "VALUES ('a', 0, '2030-01-02 00:00:00.000000', '2024-03-04 05:06:07.000000')"
+    )
+    con.commit()
+    con.close()
+    models.init_db(str(dbp))
+    repository.activate()
+    (t,) = repository.list_tasks(show_all=True)
+    assert t.created_at == datetime(2024, 3, 4, 5, 6, 7, tzinfo=timezone.utc)
+    assert t.due_date == datetime(2030, 1, 2).astimezone()
+
+
+def test_due_date_views(db):
+    now = datetime(2030, 6, 10, 15, 0).astimezone()
+    today = now.replace(hour=0, minute=0)
+    overdue = repository.add_task(title="overdue", due_date=today - timedelta(days=2))
+    due_today = repository.add_task(title="today", due_date=today)
+    later = repository.add_task(title="later", due_date=today + timedelta(days=3))
+    repository.add_task(title="far", due_date=today + timedelta(days=30))
+    repository.add_task(title="none")
+    done = repository.add_task(title="done", due_date=today)
+    repository.set_done(done, True)
+
+    assert [t.id for t in repository.list_overdue(now)] == [overdue]
+    assert [t.id for t in repository.list_due_today(now)] == [due_today]
+    assert [t.id for t in repository.list_due_within(7, now)] == [due_today, later]
+
+    counts = repository.count_due_per_day(now, days=7)
+    assert list(counts) == [(today + timedelta(days=i)).date() for i in range(7)]
+    assert counts[today.date()] == 1 and counts[(today + timedelta(days=3)).date()] == 1
+    assert sum(counts.values()) == 2
+    assert repository.count_due_per_day(now, days=1, include_done=True)[today.date()] == 2
+
+
+def test_tag_filtering_and_counts(db):
+    a = repository.add_task(title="a")
+    b = repository.add_task(title="b")
+    c = repository.add_task(title="c")
+    repository.set_task_tags(a, ["work", "urgent"])
+    repository.set_task_tags(b, ["work", " work ", ""])
+    repository.set_task_tags(c, ["home"])
+    repository.set_done(b, True)
+
+    assert repository.get_task_tags(b) == ["work"]
+    assert {t.id for t in repository.list_tasks_by_tags(["work", "home"])} == {a, b, c}
+    assert [t.id for t in repository.list_tasks_by_tags(["work", "urgent"], match_all=True)] == [a]
+    assert [t.id for t in repository.list_tasks_by_tags(["work"], show_all=False)] == [a]
+    assert repository.tag_counts() == [("home", 1, 0), ("urgent", 1, 0), ("work", 1, 1)]
+
+    repository.set_task_tags(a, [])
+    repository.delete_task(c)
+    assert repository.tag_counts() == [("home", 0, 0), ("urgent", 0, 0), ("work", 0, 1)]
+    assert repository.list_tasks_by_tags(["urgent"]) == []
+
+
+def test_large_notes_are_stored_compressed(db):
+    log = "ERROR something failed\n" * 2000
+    big = repository.add_task(title="log", notes=log)
+    small = repository.add_task(title="short", notes="short note")
+    with db.connect() as conn:
+        kinds = dict(conn.exec_driver_sql("SELECT title, typeof(notes) FROM tasks").fetchall())
+        stored = conn.exec_driver_sql("SELECT length(notes) FROM tasks WHERE id = ?", (big,)).scalar()
+    assert kinds == {"log": "blob", "short": "text"}
+    assert stored < len(log) // 10
+    repository.activate()  # read back from the database, not the notes cache
+    assert repository.get_task_notes(big) == log
+    assert repository.get_task(big).notes == log
+    assert repository.get_task_notes(small) == "short note"
+    assert models.decompress_notes(models.compress_notes(log)) == log
+
+
+def test_old_notes_are_compressed_after_opening(tmp_path):
+    dbp = str(tmp_path / "old.db")
+    models.create_db_engine(dbp).dispose()
+    log = "line\n" * 5000
+    con = sqlite3.connect(dbp)
+    con.execute("INSERT INTO tasks (title, notes, has_notes, done, uid) VALUES ('a', ?, 1, 0, 'u1')", (log,))
+    con.execute("DELETE FROM change_log")
+    con.execute("PRAGMA user_version = 4")  # a database from an older version
+    con.commit()
+    con.close()
+    engine = models.init_db(dbp)
+    repository.activate()
+    # opening does not rewrite notes (that would hold the write lock for the whole table)...
+    con = sqlite3.connect(dbp)
+    assert con.execute("SELECT typeof(notes) FROM tasks").fetchone() == ("text",)
+    (t,) = repository.list_tasks()
+    assert repository.get_task_notes(t.id) == log
+    # ...the idle maintenance does, in batches
+    assert maintenance.run_maintenance(engine)["compressed"] == 1
+    assert con.execute("SELECT typeof(notes) FROM tasks").fetchone() == ("blob",)
+    assert con.execute("SELECT count(*) FROM change_log").fetchone() == (0,)
+    con.close()
+    repository.activate()
+    assert repository.get_task_notes(t.id) == log
+
+
+def test_delete_is_a_tombstone_that_can_be_restored(db):
+    keep = repository.add_task(title="keep", due_date=datetime(2030, 1, 1).astimezone())
+    gone = repository.add_task(title="gone", due_date=datetime(2030, 1, 1).astimezone())
+    repository.set_task_tags(gone, ["work"])
+    repository.set_task_tags(keep, ["work"])
+    assert repository.delete_task(gone)
+    assert not repository.delete_task(gone)
+    assert [t.id for t in repository.list_tasks()] == [keep]
+    assert [t.id for t in repository.list_due_between(None, None)] == [keep]
+    assert [t.id for t in repository.list_tasks_by_tags(["work"])] == [keep]
+    assert repository.tag_counts() == [("work", 1, 0)]
+    assert repository.get_task(gone) is None
+    assert not repository.set_done(gone)
+    with db.connect() as conn:
+        assert conn.exec_driver_sql("SELECT deleted_at IS NOT NULL FROM tasks WHERE id = ?", (gone,)).scalar()
+
+    assert repository.restore_task(gone)
+    assert not repository.restore_task(gone)
+    assert sorted(t.id for t in repository.list_tasks()) == [keep, gone]
+    assert repository.get_task_tags(gone) == ["work"]
@@ -0,0 +1,51 @@
+import sqlite3
+
+import pytest
+
+from todo_desktop import scenarios
+
+
+@pytest.fixture
+def seeded(tmp_path):
+    return scenarios.seed_database(str(tmp_path / "scenario.db"), 300)
+
+
+def test_seed_database(seeded):
+    con = sqlite3.connect(seeded)
+    try:
+        assert con.execute("SELECT count(*) FROM tasks").fetchone()[0] == 300
+        assert con.execute("SELECT count(*) FROM tasks WHERE has_notes").fetchone()[0] == 43
+        assert con.execute("SELECT count(*) FROM change_log").fetchone()[0] == 0
+    finally:
+        con.close()
+
+
+def test_default_script_within_budgets(seeded, qapp):
+    results = scenarios.run_scenario(seeded)
+    assert [r.name for r in results] == ["construct"] + [name for name, _ in scenarios.DEFAULT_SCRIPT]
+    assert all(r.wall_ms >= 0 and r.stall_ms >= 0 for r in results)
+    assert scenarios.check_budgets(results) == []
+
+    # the script ends with delete + undo, so the seeded tasks plus the added one are all back
+    con = sqlite3.connect(seeded)
+    try:
+        assert con.execute("SELECT count(*) FROM tasks WHERE deleted_at IS NULL").fetchone()[0] == 301
+        assert con.execute("SELECT count(*) FROM tasks WHERE title = 'Scenario task'").fetchone()[0] <= 1
+        # the edit only changed the title of the top task (highest priority, not done)
+        edited = con.execute("SELECT priority, done FROM tasks WHERE title = 'Scenario task (edited)'").fetchall()
+        assert edited == [(10, 0)]
+    finally:
+        con.close()
+
+
+def test_budget_violations():
+    results = [scenarios.ActionResult("toggle", 12.0, 3.0), scenarios.ActionResult("other", 1e6, 1e6)]
+    budgets = {"toggle": scenarios.Budget(10, 5)}
+    assert scenarios.check_budgets(results, budgets) == ["toggle: wall 12.0 ms > 10 ms"]
+    assert scenarios._parse_budget("toggle=150") == ("toggle", scenarios.Budget(150, 150))
+    assert scenarios._parse_budget("construct=2000:1500") == ("construct", scenarios.Budget(2000, 1500))
+
+
+def test_unknown_action(seeded, qapp):
+    with pytest.raises(ValueError):
+        scenarios.run_scenario(seeded, [("dance", {})])
@@ -0,0 +1,177 @@
+import http.client
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from todo_desktop import repository
+
+
+def _request(conn, method, path, body=None, headers=None):
+    payload = json.dumps(body).encode() if body is not None else None
+    conn.request(method, path, body=payload, headers=headers or {})
+    resp = conn.getresponse()
+    data = resp.read()
+    return resp, (json.loads(data) if data and resp.getheader("Content-Type", "").startswith("application/json") else data)
+
+
+def test_crud_and_bulk_update(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    resp, body = _request(conn, "POST", "/tasks", {"title": "a", "notes": "n", "tags": ["work"]})
+    assert resp.status == 201
+    a = body["id"]
+    _, body = _request(conn, "POST", "/tasks", {"title": "b", "due_date": "2030-01-02"})
+    b = body["id"]
+
+    resp, body = _request(conn, "GET", f"/tasks/{a}")
+    assert body["notes"] == "n" and body["tags"] == ["work"]
+    resp, body = _request(conn, "PATCH", "/tasks", [{"id": a, "done": True}, {"id": b, "priority": 3}, {"id": 999}])
+    assert body == {"updated": [a, b], "missing": [999]}
+    _, body = _request(conn, "GET", "/tasks?done=false")
+    assert [t["id"] for t in body["items"]] == [b] and body["items"][0]["priority"] == 3
+    _, body = _request(conn, "GET", "/tasks?tag=work")
+    assert [t["id"] for t in body["items"]] == [a]
+
+    resp, _ = _request(conn, "DELETE", f"/tasks/{a}")
+    assert resp.status == 204
+    resp, body = _request(conn, "GET", f"/tasks/{a}")
+    assert resp.status == 404
+    resp, body = _request(conn, "POST", "/tasks", {"notes": "no title"})
+    assert resp.status == 400
+    resp, body = _request(conn, "PATCH", f"/tasks/{b}", {"done": "false"})
+    assert resp.status == 400 and "done" in body["error"]
+
+
+def test_invalid_fields_are_rejected_before_writing(server, monkeypatch):
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    _, body = _request(conn, "POST", "/tasks", {"title": "kept"})
+    tid = body["id"]
+    bad = [
+        ({"tags": [1]}, "tags"),
+        ({"tags": "work"}, "tags"),
+        ({"notes": {"x": 1}}, "notes"),
+        ({"priority": True}, "priority"),
+    ]
+    for fields, name in bad:
+        resp, body = _request(conn, "POST", "/tasks", dict(fields, title="bad"))
+        assert resp.status == 400 and name in body["error"]
+        resp, body = _request(conn, "PATCH", f"/tasks/{tid}", fields)
+        assert resp.status == 400 and name in body["error"]
+    _, body = _request(conn, "GET", "/tasks")
+    assert [t["title"] for t in body["items"]] == ["kept"]
+    _, body = _request(conn, "GET", f"/tasks/{tid}")
+    assert body["tags"] == [] and body["priority"] == 0 and body["notes"] is None
+
+    # done and tags are stored together with the new task
+    _, body = _request(conn, "POST", "/tasks", {"title": "t", "done": True, "tags": ["a", "b"]})
+    _, body = _request(conn, "GET", f"/tasks/{body['id']}")
+    assert body["done"] is True and body["tags"] == ["a", "b"]
+
+    def fail(task_id):
+        raise RuntimeError("SELECT secret FROM tasks")
+
+    monkeypatch.setattr(repository, "get_task", fail)
+    resp, body = _request(conn, "GET", f"/tasks/{tid}")
+    assert resp.status == 500 and body == {"error": "Internal Server Error"}
+
+
+def test_done_filter_with_due_range(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    today = repository.start_of_day().isoformat()
+    ids = [_request(conn, "POST", "/tasks", {"title": f"t{i}", "due_date": today})[1]["id"] for i in range(2)]
+    _request(conn, "PATCH", f"/tasks/{ids[0]}", {"done": True})
+    for done, expected in (("true", ids[:1]), ("false", ids[1:]), (None, ids)):
+        query = "/tasks?due=today" + (f"&done={done}" if done else "")
+        _, body = _request(conn, "GET", query)
+        assert sorted(t["id"] for t in body["items"]) == expected, query
+
+
+def test_pagination_and_conditional_get(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    for i in range(5):
+        _request(conn, "POST", "/tasks", {"title": f"t{i}"})
+    resp, body = _request(conn, "GET", "/tasks?limit=2&offset=2")
+    assert [t["title"] for t in body["items"]] == ["t2", "t3"] and body["next_offset"] == 4
+    etag = resp.getheader("ETag")
+
+    resp, _ = _request(conn, "GET", "/tasks?limit=2&offset=2", headers={"If-None-Match": etag})
+    assert resp.status == 304
+    resp, _ = _request(conn, "GET", "/tasks?limit=2&offset=0", headers={"If-None-Match": etag})
+    assert resp.status == 200
+    _request(conn, "POST", "/tasks", {"title": "t5"})
+    resp, _ = _request(conn, "GET", "/tasks?limit=2&offset=2", headers={"If-None-Match": etag})
+    assert resp.status == 200 and resp.getheader("ETag") != etag
+
+
+def test_etag_sees_writes_from_other_processes(server):
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    _request(conn, "POST", "/tasks", {"title": "t0"})
+    resp, _ = _request(conn, "GET", "/tasks")
+    etag = resp.getheader("ETag")
+    # e.g. the GUI writing to the same file
+    other = sqlite3.connect(server.db_path)
+    with other:
+        other.execute("INSERT INTO tasks (title, has_notes, done, priority, created_at, uid) VALUES ('outside', 0, 0, 0, 0, 'x')")
+    other.close()
+    resp, body = _request(conn, "GET", "/tasks", headers={"If-None-Match": etag})
+    assert resp.status == 200 and [t["title"] for t in body["items"]] == ["outside", "t0"]
+
+
+def test_etag_of_date_relative_views_changes_at_midnight(server, monkeypatch):
+    day = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    monkeypatch.setattr(repository, "start_of_day", lambda now=None: day)
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    _request(conn, "POST", "/tasks", {"title": "t", "due_date": "2030-01-01T00:00:00+00:00"})
+    resp, body = _request(conn, "GET", "/tasks?due=today")
+    assert len(body["items"]) == 1
+    etag = resp.getheader("ETag")
+    day += timedelta(days=1)
+    resp, body = _request(conn, "GET", "/tasks?due=today", headers={"If-None-Match": etag})
+    assert resp.status == 200 and body["items"] == []
+
+
+def test_ndjson_streaming(server, monkeypatch):
+    monkeypatch.setattr("todo_desktop.server.STREAM_BATCH", 7)
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    for i in range(20):
+        _request(conn, "POST", "/tasks", {"title": f"t{i}"})
+    resp, body = _request(conn, "GET", "/tasks.ndjson")
+    assert resp.getheader("Transfer-Encoding") == "chunked"
+    lines = body.decode("utf-8").splitlines()
+    assert [json.loads(line)["title"] for line in lines] == [f"t{i}" for i in range(20)]
+
+
+def test_load_against_localhost(server):
+    """Many concurrent keep-alive clients mixing reads and writes; every request must succeed."""
+    clients, per_client = 8, 40
+
+    def worker(n):
+        conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=10)
+        latencies = []
+        for i in range(per_client):
+            start = time.perf_counter()
+            if i % 4 == 0:
+                resp, _ = _request(conn, "POST", "/tasks", {"title": f"c{n}-{i}", "priority": i % 5})
+                assert resp.status == 201
+            else:
+                resp, body = _request(conn, "GET", f"/tasks?limit=20&offset={i}")
+                assert resp.status == 200 and "items" in body
+            latencies.append(time.perf_counter() - start)
+        conn.close()
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        latencies = sorted(sum(pool.map(worker, range(clients)), []))
+    elapsed = time.perf_counter() - started
+    assert len(latencies) == clients * per_client
+    p95 = latencies[int(len(latencies) * 0.95)]
+    # generous bounds: this guards against pathological regressions (serialised
+    # connections, per-request reconnects), not against slow CI machines
+    assert p95 < 1.0
+    assert len(latencies) / elapsed > 50
+
+    conn = http.client.HTTPConnection("127.0.0.1", server.port)
+    _, body = _request(conn, "GET", "/tasks?limit=1000")
+    assert len(body["items"]) == clients * per_client // 4
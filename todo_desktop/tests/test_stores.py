@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from todo_desktop import repository
+from todo_desktop.cli import main as cli_main
+from todo_desktop.models import create_db_engine, make_sessionmaker
+from todo_desktop.stores import BACKENDS, SQLiteStore, open_store
+
+
+@pytest.fixture(params=BACKENDS)
+def store(request, tmp_path):
+    path = str(tmp_path / "stores.db")
+    engine = create_db_engine(path)
+    state = repository.RepositoryState(make_sessionmaker(engine))
+    st = open_store(request.param, path, state=state)
+    yield st
+    st.close()
+    engine.dispose()
+
+
+def test_crud_and_list_order(store):
+    a = store.add_task("low", priority=1)
+    b = store.add_task("high", notes="n", priority=5)
+    c = store.add_task("done", priority=9)
+    assert store.set_done(c, True)
+    assert [t.id for t in store.list_tasks()] == [b, a, c]
+    assert [t.id for t in store.list_tasks(show_all=False)] == [b, a]
+
+    t = store.get_task(b)
+    assert (t.title, t.notes, t.has_notes, t.done) == ("high", "n", True, False)
+    assert len(t.uid) == 32
+    assert store.get_task_notes(a) is None
+
+    assert store.update_task(a, title="renamed", notes="x", bogus=1)
+    t = store.get_task(a)
+    assert (t.title, t.has_notes, store.get_task_notes(a)) == ("renamed", True, "x")
+    assert t.updated_at is not None
+
+    assert store.delete_task(b)
+    assert not store.delete_task(b)
+    assert not store.set_done(b)
+    assert store.get_task(b) is None
+    assert [t.id for t in store.list_tasks()] == [a, c]
+    assert store.restore_task(b) and not store.restore_task(b)
+    assert [t.id for t in store.list_tasks()] == [b, a, c]
+
+
+def test_due_ranges(store):
+    now = datetime(2030, 5, 1, 12, tzinfo=timezone.utc)
+    ids = [store.add_task(f"t{i}", due_date=now + timedelta(days=i)) for i in range(-2, 3)]
+    store.add_task("no due date")
+    store.set_done(ids[3], True)
+    assert [t.id for t in store.list_due_between(now, now + timedelta(days=5))] == [ids[2], ids[4]]
+    assert [t.id for t in store.list_due_between(None, now)] == ids[:2]
+    assert len(store.list_due_between(None, None, include_done=True)) == 5
+    upcoming = store.list_upcoming_due(after=now)
+    assert [(tid, due) for tid, _, due in upcoming] == [(ids[2], now), (ids[4], now + timedelta(days=2))]
+
+
+def test_writes_notify_listeners(store):
+    events = []
+    listener = lambda op, tid, values: events.append((op, tid, values and values["done"]))  # noqa: E731
+    repository.add_listener(listener)
+    try:
+        tid = store.add_task("x")
+        store.set_done(tid, True)
+        store.delete_task(tid)
+    finally:
+        repository.remove_listener(listener)
+    assert events == [("add", tid, False), ("update", tid, True), ("delete", tid, None)]
+
+
+def test_sqlite_store_shares_caches_with_orm(tmp_path):
+    path = str(tmp_path / "shared.db")
+    engine = create_db_engine(path)
+    state = repository.RepositoryState(make_sessionmaker(engine))
+    store = SQLiteStore(path, state=state)
+    try:
+        with repository.using(state):
+            assert repository.list_tasks() == []
+            tid = store.add_task("via sqlite3")
+            assert [t.title for t in repository.list_tasks()] == ["via sqlite3"]
+            repository.set_done(tid, True)
+        assert store.list_tasks()[0].done
+    finally:
+        store.close()
+        engine.dispose()
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        open_store("nosql")
+
+
+def test_persistent_stores_only(tmp_path, monkeypatch, capsys):
+    # the window writes tags and reminders to the database, next to the store's tasks
+    with pytest.raises(ValueError):
+        open_store("memory", persistent=True)
+    store = open_store("sqlite", str(tmp_path / "p.db"), persistent=True)
+    store.close()
+
+    monkeypatch.setenv("TODO_BACKEND", "memory")
+    with pytest.raises(SystemExit):
+        cli_main([])
+    assert "TODO_BACKEND" in capsys.readouterr().err
@@ -0,0 +1,178 @@
+import shutil
+import sqlite3
+
+import pytest
+from sqlalchemy import text
+
+from todo_desktop import maintenance, repository
+from todo_desktop.models import create_db_engine, make_sessionmaker
+from todo_desktop.sync import SyncClient
+
+
+class Device:
+    def __init__(self, path, url):
+        self.engine = create_db_engine(str(path))
+        self.state = repository.RepositoryState(make_sessionmaker(self.engine))
+        self.client = SyncClient(url, state=self.state)
+
+    def __getattr__(self, name):
+        # run repository functions against this device's database
+        fn = getattr(repository, name)
+
+        def call(*args, **kwargs):
+            with repository.using(self.state):
+                return fn(*args, **kwargs)
+        return call
+
+    def titles(self):
+        return sorted(t.title for t in self.list_tasks())
+
+    def touch(self, task_id, epoch):
+        with self.engine.begin() as conn:
+            conn.execute(text("UPDATE tasks SET updated_at = :ts WHERE id = :id"), {"ts": epoch, "id": task_id})
+        self.state.invalidate()
+
+
+@pytest.fixture
+def devices(server, tmp_path):
+    url = f"http://127.0.0.1:{server.port}"
+    laptop, desktop = Device(tmp_path / "laptop.db", url), Device(tmp_path / "desktop.db", url)
+    yield laptop, desktop
+    laptop.engine.dispose()
+    desktop.engine.dispose()
+
+
+def test_changes_propagate_between_devices(devices):
+    laptop, desktop = devices
+    tid = laptop.add_task(title="write report", notes="draft", priority=2)
+    laptop.set_task_tags(tid, ["work"])
+    assert laptop.client.sync()["pushed"] == 1
+    assert desktop.client.sync()["pulled"] == 1
+    (t,) = desktop.list_tasks()
+    assert (t.title, t.priority, desktop.get_task_notes(t.id)) == ("write report", 2, "draft")
+    assert desktop.get_task_tags(t.id) == ["work"]
+
+    desktop.set_done(t.id, True)
+    desktop.client.sync()
+    laptop.client.sync()
+    assert laptop.get_task(tid).done
+
+    laptop.delete_task(tid)
+    laptop.client.sync()
+    desktop.client.sync()
+    assert desktop.list_tasks() == []
+
+    # undo on the other device, later than the delete
+    assert desktop.restore_task(t.id)
+    desktop.touch(t.id, 2_000_000_000)
+    desktop.client.sync()
+    laptop.client.sync()
+    assert laptop.titles() == ["write report"]
+
+
+def test_purge_does_not_override_a_later_restore(devices):
+    laptop, desktop = devices
+    tid = laptop.add_task(title="keep me")
+    laptop.touch(tid, 900_000_000)
+    laptop.client.sync()
+    desktop.client.sync()
+    (other,) = desktop.list_tasks()
+    laptop.delete_task(tid)
+    with laptop.engine.begin() as conn:
+        conn.execute(text("UPDATE tasks SET deleted_at = 1000000000, updated_at = 1000000000 WHERE id = :id"),
+                     {"id": tid})
+    laptop.client.sync()
+    desktop.client.sync()
+    assert desktop.list_tasks() == []
+
+    # restored on the desktop after the delete, purged on the laptop later still
+    assert desktop.restore_task(other.id)
+    desktop.touch(other.id, 1_500_000_000)
+    desktop.client.sync()
+    assert maintenance.purge_deleted(laptop.engine, older_than=0) == 1
+    laptop.state.invalidate()
+
+    laptop.client.sync()
+    desktop.client.sync()
+    assert laptop.titles() == desktop.titles() == ["keep me"]
+
+
+def test_conflicts_resolved_by_updated_at(devices):
+    laptop, desktop = devices
+    tid = laptop.add_task(title="original")
+    laptop.client.sync()
+    desktop.client.sync()
+    (other,) = desktop.list_tasks()
+
+    laptop.update_task(tid, title="laptop edit")
+    laptop.touch(tid, 2_000_000_000)
+    desktop.update_task(other.id, title="desktop edit")
+    desktop.touch(other.id, 2_000_000_100)
+
+    laptop.client.sync()
+    desktop.client.sync()
+    laptop.client.sync()
+    assert laptop.titles() == desktop.titles() == ["desktop edit"]
+
+
+def test_second_sync_transfers_only_deltas(devices):
+    laptop, desktop = devices
+    for i in range(300):
+        laptop.add_task(title=f"task {i}", notes="some notes " * 5)
+    first = laptop.client.sync()
+    assert first["pushed"] == 300
+    desktop.client.sync()
+
+    laptop.update_task(laptop.list_tasks()[0].id, title="renamed")
+    stats = laptop.client.sync()
+    assert stats["pushed"] == 1
+    assert stats["bytes_sent"] + stats["bytes_received"] < first["bytes_sent"] / 50
+    again = desktop.client.sync()
+    assert again["pulled"] == 1
+    idle = desktop.client.sync()
+    assert (idle["pushed"], idle["pulled"], idle["bytes_sent"]) == (0, 0, 0)
+    assert idle["bytes_received"] < 100
+
+
+def test_own_pushes_are_not_pulled_back(devices):
+    laptop, desktop = devices
+    desktop.add_task(title="from desktop")
+    desktop.client.sync()
+    laptop.add_task(title="big", notes="x" * 200_000)
+    stats = laptop.client.sync()
+    assert stats["pushed"] == 1 and stats["pulled"] == 1
+    # the desktop's task comes down, the 200 KB just pushed does not
+    assert stats["bytes_sent"] > 200_000 and stats["bytes_received"] < 2_000
+    assert laptop.titles() == ["big", "from desktop"]
+    assert desktop.client.sync()["pulled"] == 1
+    assert laptop.client.sync()["pulled"] == 0
+
+
+def test_copies_of_an_old_database_share_uids(server, tmp_path):
+    # a database from before sync existed, copied to both machines by hand
+    old = tmp_path / "old.db"
+    con = sqlite3.connect(old)
+    con.execute(
+        "CREATE TABLE tasks (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL, notes TEXT, done BOOLEAN NOT NULL, "
+        "priority INTEGER, due_date DATETIME, created_at DATETIME, updated_at DATETIME)"
+    )
+    con.execute("INSERT INTO tasks (title, done, created_at) VALUES ('shared', 0, '2024-03-04 05:06:07.000000')")
+    con.commit()
+    con.close()
+    shutil.copy(old, tmp_path / "laptop.db")
+    shutil.copy(old, tmp_path / "desktop.db")
+    # edited on one copy before the upgrade: still the same task
+    con = sqlite3.connect(tmp_path / "laptop.db")
+    con.execute("UPDATE tasks SET title = 'shared (edited)', updated_at = '2024-05-01 00:00:00.000000'")
+    con.commit()
+    con.close()
+    url = f"http://127.0.0.1:{server.port}"
+    laptop, desktop = Device(tmp_path / "laptop.db", url), Device(tmp_path / "desktop.db", url)
+    try:
+        laptop.client.sync()
+        desktop.client.sync()
+        laptop.client.sync()
+        assert laptop.titles() == desktop.titles() == ["shared (edited)"]
+    finally:
+        laptop.engine.dispose()
+        desktop.engine.dispose()
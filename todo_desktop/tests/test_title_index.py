@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta, timezone
+
+from todo_desktop import repository
+from todo_desktop.title_index import TitleIndex
+
+NOW = datetime(2030, 1, 1, tzinfo=timezone.utc)
+
+
+def test_prefix_match_is_case_insensitive_and_ranked():
+    stats = [
+        ("Buy milk", 5, NOW - timedelta(days=1)),
+        ("buy bread", 2, NOW),
+        ("Buyer meeting", 1, NOW),
+        ("Call mom", 9, NOW),
+        ("BUY MILK", 1, NOW - timedelta(days=400)),
+    ]
+    index = TitleIndex(loader=lambda: stats)
+    assert index.suggest("bu") == ["Buy milk", "buy bread", "Buyer meeting"]
+    assert index.suggest("BUY ") == ["Buy milk", "buy bread"]
+    assert index.suggest("x") == []
+    assert index.suggest("") == []
+    assert len(index) == 4
+
+
+def test_recency_outweighs_stale_frequency():
+    stats = [("Weekly report", 20, NOW - timedelta(days=365)), ("Weekend trip", 2, NOW)]
+    index = TitleIndex(loader=lambda: stats, half_life_days=30)
+    assert index.suggest("wee") == ["Weekend trip", "Weekly report"]
+
+
+def test_index_follows_repository_changes(db):
+    repository.add_task("Water plants")
+    index = TitleIndex()
+    index.attach()
+    try:
+        assert index.suggest("wa") == ["Water plants"]  # built from the database
+        tid = repository.add_task("Wash car")
+        repository.add_task("Wash car")
+        assert index.suggest("wa") == ["Wash car", "Water plants"]
+        repository.update_task(tid, title="Walk dog")
+        assert "Walk dog" in index.suggest("wal")
+    finally:
+        index.detach()
+    repository.add_task("Wax floor")
+    assert index.suggest("wax") == []
+
+
+def test_completion_model_rows(qapp):
+    from PySide6.QtWidgets import QLineEdit
+    from todo_desktop.ui.title_completer import TitleCompleter
+
+    index = TitleIndex(loader=lambda: [("Alpha", 1, NOW), ("Alpine", 3, NOW), ("Beta", 1, NOW)])
+    edit = QLineEdit()
+    completer = TitleCompleter(edit, index, limit=1)
+    completer.title_model.set_prefix("al")
+    model = completer.title_model
+    assert model.rowCount() == 1
+    assert model.data(model.index(0, 0)) == "Alpine"
@@ -0,0 +1,57 @@
+import pytest
+
+from todo_desktop import repository
+from todo_desktop.workspaces import DEFAULT_WORKSPACE, WorkspacePool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = WorkspacePool(str(tmp_path), capacity=2)
+    yield pool
+    pool.close_all()
+
+
+def test_workspaces_are_separate_databases(pool, tmp_path):
+    pool.activate(DEFAULT_WORKSPACE)
+    repository.add_task(title="home task")
+    pool.activate("team")
+    repository.add_task(title="team task")
+    assert [t.title for t in repository.list_tasks()] == ["team task"]
+    pool.activate(DEFAULT_WORKSPACE)
+    assert [t.title for t in repository.list_tasks()] == ["home task"]
+    assert pool.names() == [DEFAULT_WORKSPACE, "team"]
+    assert (tmp_path / "todo_desktop.db").exists() and (tmp_path / "workspaces" / "team.db").exists()
+
+
+def test_pool_keeps_recent_workspaces_and_their_caches(pool):
+    a = pool.activate("a")
+    cached = repository.list_tasks()
+    pool.activate("b")
+    assert pool.activate("a") is a
+    assert repository.list_tasks() is cached
+
+    pool.activate("c")
+    # capacity 2: the least recently used workspace ("b") was closed, the active one kept
+    assert pool.is_open("c") and pool.is_open("a") and not pool.is_open("b")
+
+
+def test_idle_workspaces_are_closed(pool):
+    pool.max_idle = 0
+    pool.activate("a")
+    pool.activate("b")
+    assert not pool.is_open("a") and pool.is_open("b")
+
+
+def test_using_does_not_change_active_workspace(pool):
+    pool.activate("a")
+    other = pool.get("b")
+    with repository.using(other.state):
+        repository.add_task(title="in b")
+    assert repository.list_tasks() == []
+    with repository.using(other.state):
+        assert [t.title for t in repository.list_tasks()] == ["in b"]
+
+
+def test_invalid_workspace_name(pool):
+    with pytest.raises(ValueError):
+        pool.activate("../escape")
@@ -0,0 +1,142 @@
+"""In-memory prefix index over task titles, used for title autocompletion."""
+import heapq
+import math
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import repository
+
+# sorts after every character a title can start with, so [prefix, prefix + _HIGH) covers all matches
+_HIGH = "\U0010ffff"
+
+
+def _key(title: str) -> str:
+    return " ".join(title.split()).casefold()
+
+
+class TitleIndex:
+    """Case-insensitive prefix lookup over the distinct titles in the database.
+
+    Titles are kept as a sorted list of normalised keys, so the matches for a
+    prefix are one contiguous slice found with two binary searches. Matches are
+    ranked by how often a title was used, decayed by how long ago it was last
+    used (halving every `half_life_days`). The ranking of two titles does not
+    change while neither is used again, so the top matches per prefix are
+    cached, and using a title only drops the cached results for its own
+    prefixes.
+
+    The index is built on the first lookup from one GROUP BY query and kept
+    up to date from repository change notifications after `attach()`.
+    """
+
+    def __init__(self, loader: Optional[Callable[[], Iterable[Tuple[str, int, Optional[datetime]]]]] = None,
+                 half_life_days: float = 30, cache_size: int = 2048):
+        self._loader = loader or repository.title_stats
+        self._rate = math.log(2) / (half_life_days * 86400)
+        self._cache_size = cache_size
+        self._keys: List[str] = []
+        self._entries: Dict[str, list] = {}  # key -> [display title, count, last used timestamp]
+        self._top: "OrderedDict[Tuple[str, int], List[str]]" = OrderedDict()
+        self._loaded = False
+        self._attached = False
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._keys)
+
+    def attach(self):
+        if not self._attached:
+            repository.add_listener(self._on_task_changed)
+            self._attached = True
+
+    def detach(self):
+        repository.remove_listener(self._on_task_changed)
+        self._attached = False
+
+    def reset(self):
+        """Forget everything; the index is rebuilt on the next lookup (e.g. after switching databases)."""
+        self._keys = []
+        self._entries = {}
+        self._top.clear()
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        entries: Dict[str, list] = {}
+        for title, count, last in self._loader():
+            key = _key(title or "")
+            if not key:
+                continue
+            ts = last.timestamp() if last else 0.0
+            entry = entries.get(key)
+            if entry is None:
+                entries[key] = [title.strip(), count, ts]
+            else:
+                # titles differing only in case/spacing share one entry showing the latest spelling
+                entry[1] += count
+                if ts >= entry[2]:
+                    entry[0], entry[2] = title.strip(), ts
+        self._entries = entries
+        self._keys = sorted(entries)
+        self._top.clear()
+        self._loaded = True
+
+    def _score(self, entry: list) -> float:
+        # log of count * 2 ** -(age / half life), minus a term that is the same for every title
+        return math.log(entry[1]) + entry[2] * self._rate
+
+    def record(self, title: str, ts: Optional[float] = None, count: int = 1):
+        """Note a use of `title` (a new task, or `count=0` for an edit that only refreshes recency)."""
+        if not self._loaded:
+            return  # picked up by the initial load
+        key = _key(title or "")
+        if not key:
+            return
+        ts = time.time() if ts is None else ts
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = [title.strip(), max(count, 1), ts]
+            insort(self._keys, key)
+        else:
+            entry[1] += count
+            if ts >= entry[2]:
+                entry[0], entry[2] = title.strip(), ts
+        # only the cached results for prefixes of this title can change
+        for cached in [k for k in self._top if key.startswith(k[0])]:
+            del self._top[cached]
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        """Up to `limit` titles starting with `prefix`, best first."""
+        self._ensure_loaded()
+        p = _key(prefix or "")
+        if not p:
+            return []
+        if prefix[-1].isspace():
+            p += " "  # "buy " should not match "buyer"
+        cache_key = (p, limit)
+        result = self._top.get(cache_key)
+        if result is not None:
+            self._top.move_to_end(cache_key)
+            return result
+        lo = bisect_left(self._keys, p)
+        hi = bisect_left(self._keys, p + _HIGH, lo)
+        entries = self._entries
+        if hi - lo <= limit:
+            ranked = sorted(self._keys[lo:hi], key=lambda k: -self._score(entries[k]))
+        else:
+            ranked = heapq.nlargest(limit, self._keys[lo:hi], key=lambda k: self._score(entries[k]))
+        result = [entries[k][0] for k in ranked]
+        self._top[cache_key] = result
+        if len(self._top) > self._cache_size:
+            self._top.popitem(last=False)
+        return result
+
+    def _on_task_changed(self, op: str, task_id: int, values: Optional[dict]):
+        if op == "delete" or not values or not values.get("title"):
+            return
+        # an edit usually keeps the title, so only count new tasks as another use
+        self.record(values["title"], count=1 if op == "add" else 0)
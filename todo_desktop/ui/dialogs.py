@@ -10,10 +10,13 @@
 )
 from PySide6.QtCore import Qt, QDate
 from datetime import datetime
+import re
+
+from .title_completer import TitleCompleter
 
 
 class TaskDialog(QDialog):
-    def __init__(self, parent=None, task=None):
+    def __init__(self, parent=None, task=None, tags=None, title_index=None):
         super().__init__(parent)
         self.setWindowTitle("任务")
         self.resize(400, 200)
@@ -22,6 +25,8 @@ class TaskDialog(QDialog):
         layout = QFormLayout(self)
 
         self.title_edit = QLineEdit()
+        # 标题自动补全：候选来自内存中的前缀索引，不在输入时查询数据库
+        self.title_completer = TitleCompleter(self.title_edit, title_index) if title_index is not None else None
         self.notes_edit = QTextEdit()
         self.prio_spin = QSpinBox()
         self.prio_spin.setRange(0, 10)
@@ -31,12 +36,15 @@ class TaskDialog(QDialog):
         self.due_edit.setCalendarPopup(True)
         self.due_edit.setDisplayFormat("yyyy-MM-dd")
         self.due_edit.setDate(QDate.currentDate())
+        self.tags_edit = QLineEdit()
+        self.tags_edit.setPlaceholderText("用逗号分隔，例如：工作, 紧急")
 
         layout.addRow("标题：", self.title_edit)
         layout.addRow("备注：", self.notes_edit)
         layout.addRow("优先级：", self.prio_spin)
         layout.addRow(self.due_check)
         layout.addRow("截止日期：", self.due_edit)
+        layout.addRow("标签：", self.tags_edit)
 
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, Qt.Horizontal, self)
         buttons.accepted.connect(self.accept)
@@ -55,6 +63,8 @@ class TaskDialog(QDialog):
             else:
                 self.due_check.setChecked(False)
                 self.due_edit.setEnabled(False)
+        if tags:
+            self.tags_edit.setText(", ".join(tags))
 
     def get_values(self):
         title = self.title_edit.text().strip()
@@ -62,9 +72,19 @@ class TaskDialog(QDialog):
         priority = self.prio_spin.value()
         if self.due_check.isChecked():
             due_qdate = self.due_edit.date()
-            due = datetime(due_qdate.year(), due_qdate.month(), due_qdate.day())
+            # local midnight of the chosen day, as an aware datetime like the ones read back from the db
+            due = datetime(due_qdate.year(), due_qdate.month(), due_qdate.day()).astimezone()
         else:
             due = None
         if not title:
             title = "(未命名)"
         return title, notes, priority, due
+
+    def get_tags(self):
+        """标签列表（支持中英文逗号分隔，去除空白与重复项）。"""
+        tags = []
+        for name in re.split(r"[,，]", self.tags_edit.text()):
+            name = name.strip()
+            if name and name not in tags:
+                tags.append(name)
+        return tags
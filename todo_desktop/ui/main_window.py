@@ -1,14 +1,20 @@
 ﻿from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QTableView, QPushButton, QLabel, QMessageBox, QHeaderView, QAbstractItemView, QToolTip, QSpinBox
+    QTableView, QPushButton, QLabel, QMessageBox, QHeaderView, QAbstractItemView, QToolTip, QSpinBox,
+    QButtonGroup, QSystemTrayIcon, QListWidget, QListWidgetItem, QCheckBox, QComboBox, QInputDialog
 )
 from PySide6.QtCore import Qt
-from PySide6.QtGui import QCursor, QFont, QFontMetrics, QIcon
+from PySide6.QtGui import QCursor, QFont, QFontMetrics, QIcon, QKeySequence
 import os
+from datetime import timedelta
 from pathlib import Path
 from .task_model import TaskTableModel
 
-from .. import models, repository
+from .. import repository
+from ..reminders import ReminderScheduler
+from ..stores import open_store
+from ..title_index import TitleIndex
+from ..workspaces import DEFAULT_WORKSPACE, WorkspacePool
 from .dialogs import TaskDialog
 
 # Simple translation mapping for UI strings
@@ -18,6 +24,8 @@ _TRANSLATIONS = {
         "add": "添加",
         "edit": "编辑",
         "delete": "删除",
+        "undo_delete": "撤销删除",
+        "undo_tooltip": "恢复最近删除的任务 (Ctrl+Z)",
         "pin_tooltip": "置顶：保持窗口在其他窗口之上",
         "font_tooltip": "界面文字大小",
         "lang_btn": "中文",
@@ -28,12 +36,26 @@ _TRANSLATIONS = {
         "status_fmt": "总任务: {total} | 未完成: {pending} | 已完成: {completed}",
         "done": "已完成",
         "pending": "未完成",
+        "filter_all": "全部",
+        "filter_overdue": "已逾期",
+        "filter_today": "今天",
+        "filter_week": "未来7天",
+        "reminder_title": "任务到期",
+        "workspace_tooltip": "切换工作区（每个工作区是独立的数据库文件）",
+        "new_workspace": "新建工作区",
+        "new_workspace_prompt": "工作区名称：",
+        "invalid_workspace": "工作区名称只能包含字母、数字、下划线、空格和连字符。",
+        "match_all": "匹配全部标签",
+        "match_all_tooltip": "选中多个标签时：勾选为同时包含全部标签，否则包含任一标签",
+        "tag_counts_fmt": "未完成: {pending} | 已完成: {completed}",
     },
     "en": {
         "title": "Todo List",
         "add": "Add",
         "edit": "Edit",
         "delete": "Delete",
+        "undo_delete": "Undo delete",
+        "undo_tooltip": "Restore the most recently deleted task (Ctrl+Z)",
         "pin_tooltip": "Always on top: keep window above others",
         "font_tooltip": "UI font size",
         "lang_btn": "EN",
@@ -44,15 +66,34 @@ _TRANSLATIONS = {
         "status_fmt": "Total: {total} | Pending: {pending} | Completed: {completed}",
         "done": "Done",
         "pending": "Pending",
+        "filter_all": "All",
+        "filter_overdue": "Overdue",
+        "filter_today": "Today",
+        "filter_week": "Next 7 days",
+        "reminder_title": "Task due",
+        "workspace_tooltip": "Switch workspace (each workspace is a separate database file)",
+        "new_workspace": "New workspace",
+        "new_workspace_prompt": "Workspace name:",
+        "invalid_workspace": "Workspace names may only contain letters, digits, underscores, spaces and hyphens.",
+        "match_all": "Match all tags",
+        "match_all_tooltip": "With several tags selected: checked requires every tag, unchecked any of them",
+        "tag_counts_fmt": "Pending: {pending} | Completed: {completed}",
     },
 }
 
 
 class MainWindow(QMainWindow):
-    def __init__(self, db_path: str = "todo_desktop.db"):
+    def __init__(self, db_path: str = "todo_desktop.db", workspaces: WorkspacePool = None, backend: str = None):
         super().__init__()
-        self.db_path = db_path
-        models.init_db(self.db_path)
+        # 工作区：每个工作区是独立的 SQLite 文件，最近使用的保持打开以便快速切换
+        if workspaces is None:
+            workspaces = WorkspacePool(os.path.dirname(os.path.abspath(db_path)), default_path=db_path)
+        self.workspaces = workspaces
+        self.workspace = workspaces.active or workspaces.activate(DEFAULT_WORKSPACE)
+        self.db_path = self.workspace.path
+        # 任务读写（列表、切换状态、编辑、备注）走可替换的存储后端；标签等仍使用 repository
+        self.backend = backend
+        self.store = open_store(backend, self.db_path, state=self.workspace.state, persistent=True)
         # language state: 'zh' or 'en'
         self.lang = "zh"
         self.setWindowTitle(self._tr("title"))
@@ -79,9 +120,16 @@ class MainWindow(QMainWindow):
         self.add_btn.setText(self._tr("add"))
         self.edit_btn.setText(self._tr("edit"))
         self.del_btn.setText(self._tr("delete"))
+        # 删除只是移入回收站（墓碑标记），可撤销；按删除顺序逐个恢复
+        self.undo_btn = QPushButton(self._tr("undo_delete"))
+        self.undo_btn.setToolTip(self._tr("undo_tooltip"))
+        self.undo_btn.setShortcut(QKeySequence.Undo)
+        self.undo_btn.setEnabled(False)
+        self._deleted_ids = []
         ctrl_layout.addWidget(self.add_btn)
         ctrl_layout.addWidget(self.edit_btn)
         ctrl_layout.addWidget(self.del_btn)
+        ctrl_layout.addWidget(self.undo_btn)
         # 图钉按钮：切换窗口置顶
         self.pin_btn = QPushButton("📌")
         self.pin_btn.setCheckable(True)
@@ -115,14 +163,46 @@ class MainWindow(QMainWindow):
         self.lang_btn.setFlat(True)
         self.lang_btn.setToolTip("切换语言 / Switch language")
         self.lang_btn.clicked.connect(self._toggle_language)
+        self.workspace_combo = QComboBox()
+        self.workspace_combo.addItems(self.workspaces.names())
+        self.workspace_combo.setCurrentText(self.workspace.name)
+        self.workspace_combo.setToolTip(self._tr("workspace_tooltip"))
+        self.workspace_combo.activated.connect(
+            lambda i: self._switch_workspace(self.workspace_combo.itemText(i))
+        )
+        self.new_ws_btn = QPushButton("+")
+        self.new_ws_btn.setFlat(True)
+        self.new_ws_btn.setFixedWidth(28)
+        self.new_ws_btn.setToolTip(self._tr("new_workspace"))
+        self.new_ws_btn.clicked.connect(self._on_new_workspace)
+        ctrl_layout.addWidget(self.workspace_combo)
+        ctrl_layout.addWidget(self.new_ws_btn)
         ctrl_layout.addWidget(self.lang_btn)
         ctrl_layout.addWidget(self.font_spin)
         ctrl_layout.addWidget(self.pin_btn)
         layout.addLayout(ctrl_layout)
 
+        # 快速筛选：全部 / 已逾期 / 今天 / 未来7天（由 repository 的截止日索引查询提供）
+        self.view = "all"
+        filter_layout = QHBoxLayout()
+        self.filter_group = QButtonGroup(self)
+        self.filter_group.setExclusive(True)
+        self.filter_btns = {}
+        for key in ("all", "overdue", "today", "week"):
+            btn = QPushButton(self._tr(f"filter_{key}"))
+            btn.setCheckable(True)
+            btn.setFlat(True)
+            btn.setChecked(key == self.view)
+            btn.clicked.connect(lambda _=False, k=key: self._set_view(k))
+            self.filter_group.addButton(btn)
+            self.filter_btns[key] = btn
+            filter_layout.addWidget(btn)
+        filter_layout.addStretch()
+        layout.addLayout(filter_layout)
+
         # 任务表格（使用 model/view 以提高大量行时的性能）
         self.table = QTableView()
-        self.model = TaskTableModel([])
+        self.model = TaskTableModel([], notes_loader=lambda tid: self.store.get_task_notes(tid))
         # ensure model uses current language for headers/status
         try:
             self.model.set_language(self.lang)
@@ -157,7 +237,23 @@ class MainWindow(QMainWindow):
         self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         self.table.setSortingEnabled(True)
-        layout.addWidget(self.table)
+
+        # 左侧标签栏：可多选标签切换列表（按标签过滤在 SQL 中完成，结果按视图缓存）
+        self.tag_filter = []
+        sidebar = QVBoxLayout()
+        self.tag_list = QListWidget()
+        self.tag_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.tag_list.setFixedWidth(140)
+        self.tag_list.itemSelectionChanged.connect(self._on_tag_selection_changed)
+        self.match_all_check = QCheckBox(self._tr("match_all"))
+        self.match_all_check.setToolTip(self._tr("match_all_tooltip"))
+        self.match_all_check.toggled.connect(lambda _=False: self.tag_filter and self.refresh())
+        sidebar.addWidget(self.tag_list)
+        sidebar.addWidget(self.match_all_check)
+        body = QHBoxLayout()
+        body.addLayout(sidebar)
+        body.addWidget(self.table, 1)
+        layout.addLayout(body)
 
         # 启用鼠标跟踪以接收 cellEntered 信号，显示任务备注（若有）
         self.table.setMouseTracking(True)
@@ -175,6 +271,7 @@ class MainWindow(QMainWindow):
         self.add_btn.clicked.connect(self.on_add)
         self.edit_btn.clicked.connect(self.on_edit)
         self.del_btn.clicked.connect(self.on_delete)
+        self.undo_btn.clicked.connect(self.on_undo_delete)
         self.table.clicked.connect(self.on_status_click)
         self.table.doubleClicked.connect(self.on_edit)
 
@@ -190,18 +287,38 @@ class MainWindow(QMainWindow):
         # 连接图钉按钮事件以切换置顶状态
         self.pin_btn.toggled.connect(self._toggle_always_on_top)
 
+        # 到期提醒：单个定时器按最近的截止时间触发，通过系统托盘通知
+        self.tray = None
+        try:
+            if QSystemTrayIcon.isSystemTrayAvailable():
+                self.tray = QSystemTrayIcon(self.windowIcon(), self)
+                self.tray.show()
+        except Exception:
+            self.tray = None
+        self.reminders = ReminderScheduler(parent=self)
+        self.reminders.reminder_due.connect(self._on_reminder_due)
+        try:
+            self.reminders.start()
+        except Exception:
+            pass
+
+        # 标题自动补全索引：首次打开对话框时才加载，之后随任务增改增量更新
+        self.title_index = TitleIndex()
+        self.title_index.attach()
+
         self.refresh()
 
     def refresh(self):
         # 在填充表格时禁用排序，避免插入过程中触发重排导致单元格未设置的问题
         self.table.setSortingEnabled(False)
-        tasks = repository.list_tasks(show_all=True)
+        tasks = self._load_tasks()
+        self._reload_tags()
         rows = []
         for t in tasks:
             rows.append({
                 "id": t.id,
                 "title": t.title,
-                "notes": t.notes,
+                "has_notes": bool(t.has_notes),
                 "done": bool(t.done),
                 "priority": t.priority if t.priority is not None else 0,
                 "due_date": t.due_date,
@@ -229,11 +346,117 @@ class MainWindow(QMainWindow):
             pass
         # 恢复排序
         self.table.setSortingEnabled(True)
+        self._update_week_tooltip()
         try:
             self._adjust_table_to_window()
         except Exception:
             pass
 
+    def _load_tasks(self):
+        if self.view == "tag" and self.tag_filter:
+            return repository.list_tasks_by_tags(self.tag_filter, match_all=self.match_all_check.isChecked())
+        today = repository.start_of_day()
+        if self.view == "overdue":
+            return self.store.list_due_between(None, today)
+        if self.view == "today":
+            return self.store.list_due_between(today, today + timedelta(days=1))
+        if self.view == "week":
+            return self.store.list_due_between(today, today + timedelta(days=7))
+        return self.store.list_tasks(show_all=True)
+
+    def _set_view(self, view: str):
+        if view == self.view:
+            return
+        self.view = view
+        if self.tag_filter:
+            # 快速筛选与标签筛选互斥：清除标签选择
+            self.tag_filter = []
+            self.tag_list.blockSignals(True)
+            self.tag_list.clearSelection()
+            self.tag_list.blockSignals(False)
+        self.refresh()
+
+    def _switch_workspace(self, name: str):
+        if not name or name == self.workspace.name:
+            return
+        try:
+            self.workspace = self.workspaces.activate(name)
+        except ValueError:
+            QMessageBox.warning(self, self._tr("new_workspace"), self._tr("invalid_workspace"))
+            self.workspace_combo.setCurrentText(self.workspace.name)
+            return
+        self.db_path = self.workspace.path
+        try:
+            self.store.close()
+        except Exception:
+            pass
+        self.store = open_store(self.backend, self.db_path, state=self.workspace.state, persistent=True)
+        # 撤销记录只对应之前的工作区
+        self._deleted_ids = []
+        self.undo_btn.setEnabled(False)
+        if self.workspace_combo.findText(name) < 0:
+            self.workspace_combo.addItem(name)
+        self.workspace_combo.setCurrentText(name)
+        # 新工作区从“全部”视图开始
+        self.tag_filter = []
+        self.view = "all"
+        self.filter_group.setExclusive(False)
+        for key, btn in self.filter_btns.items():
+            btn.setChecked(key == "all")
+        self.filter_group.setExclusive(True)
+        try:
+            self.reminders.reload()
+        except Exception:
+            pass
+        self.title_index.reset()
+        self.refresh()
+
+    def _on_new_workspace(self):
+        name, ok = QInputDialog.getText(self, self._tr("new_workspace"), self._tr("new_workspace_prompt"))
+        name = (name or "").strip()
+        if ok and name:
+            self._switch_workspace(name)
+
+    def _on_tag_selection_changed(self):
+        tags = [it.data(Qt.UserRole) for it in self.tag_list.selectedItems()]
+        self.tag_filter = tags
+        # 有标签选择时取消快速筛选按钮的选中状态，否则回到“全部”
+        self.filter_group.setExclusive(False)
+        for key, btn in self.filter_btns.items():
+            btn.setChecked(not tags and key == "all")
+        self.filter_group.setExclusive(True)
+        self.view = "tag" if tags else "all"
+        self.refresh()
+
+    def _reload_tags(self):
+        """重建标签栏（单次分组查询获得每个标签的未完成/已完成数量），保留当前选择。"""
+        try:
+            counts = repository.tag_counts()
+        except Exception:
+            return
+        selected = set(self.tag_filter)
+        self.tag_list.blockSignals(True)
+        try:
+            self.tag_list.clear()
+            for name, pending, completed in counts:
+                item = QListWidgetItem(f"{name} ({pending})")
+                item.setData(Qt.UserRole, name)
+                item.setToolTip(self._tr("tag_counts_fmt").format(pending=pending, completed=completed))
+                self.tag_list.addItem(item)
+                if name in selected:
+                    item.setSelected(True)
+        finally:
+            self.tag_list.blockSignals(False)
+
+    def _update_week_tooltip(self):
+        """在"未来7天"按钮的提示中显示每天的任务数（单次分组查询）。"""
+        try:
+            counts = repository.count_due_per_day(days=7)
+            lines = [f"{d.strftime('%m-%d')}: {n}" for d, n in counts.items()]
+            self.filter_btns["week"].setToolTip("\n".join(lines))
+        except Exception:
+            pass
+
     def selected_task_id(self):
         idx = self.table.currentIndex()
         if not idx.isValid():
@@ -241,10 +464,13 @@ class MainWindow(QMainWindow):
         return self.model.get_task_id(idx.row())
 
     def on_add(self):
-        dlg = TaskDialog(self)
+        dlg = TaskDialog(self, title_index=self.title_index)
         if dlg.exec():
             title, notes, priority, due = dlg.get_values()
-            repository.add_task(title=title, notes=notes, priority=priority, due_date=due)
+            tid = self.store.add_task(title=title, notes=notes, priority=priority, due_date=due)
+            tags = dlg.get_tags()
+            if tags:
+                repository.set_task_tags(tid, tags)
             # 增量更新计数
             self.pending_count += 1
             self.total_count += 1
@@ -255,15 +481,19 @@ class MainWindow(QMainWindow):
         if not tid:
             QMessageBox.information(self, self._tr("edit"), self._tr("select_task"))
             return
-        t = repository.get_task(tid)
+        t = self.store.get_task(tid)
         if not t:
             QMessageBox.warning(self, self._tr("edit"), self._tr("not_found"))
             self.refresh()
             return
-        dlg = TaskDialog(self, task=t)
+        old_tags = repository.get_task_tags(tid)
+        dlg = TaskDialog(self, task=t, tags=old_tags, title_index=self.title_index)
         if dlg.exec():
             title, notes, priority, due = dlg.get_values()
-            repository.update_task(tid, title=title, notes=notes, priority=priority, due_date=due)
+            self.store.update_task(tid, title=title, notes=notes, priority=priority, due_date=due)
+            tags = dlg.get_tags()
+            if tags != old_tags:
+                repository.set_task_tags(tid, tags)
             self.refresh()
 
     def on_status_click(self, index):
@@ -277,11 +507,9 @@ class MainWindow(QMainWindow):
             tid = self.model.get_task_id(row)
             if not tid:
                 return
-            t = repository.get_task(tid)
-            if not t:
-                return
-            new_done = not t.done
-            repository.set_done(tid, new_done)
+            # 状态取自表格中的行，不再读取整条任务（否则会加载并解压备注）
+            new_done = not self.model.is_done(row)
+            self.store.set_done(tid, new_done)
             # refresh view (keeps logic simple and correct)
             self.refresh()
         except Exception:
@@ -292,22 +520,38 @@ class MainWindow(QMainWindow):
         if not tid:
             QMessageBox.information(self, self._tr("delete"), self._tr("select_task"))
             return
-        t = repository.get_task(tid)
-        if not t:
+        # 完成状态取自表格中的行，避免为计数而加载备注
+        done = self.model.is_done(self.table.currentIndex().row())
+        if QMessageBox.question(self, self._tr("delete"), self._tr("confirm_delete")) != QMessageBox.StandardButton.Yes:
+            return
+        if not self.store.delete_task(tid):
             QMessageBox.warning(self, self._tr("delete"), self._tr("not_found"))
             self.refresh()
             return
-        if QMessageBox.question(self, self._tr("delete"), self._tr("confirm_delete")) != QMessageBox.StandardButton.Yes:
-            return
-        repository.delete_task(tid)
+        self._deleted_ids.append(tid)
+        self.undo_btn.setEnabled(True)
         # 增量更新计数
         self.total_count -= 1
-        if t.done:
+        if done:
             self.completed_count -= 1
         else:
             self.pending_count -= 1
         self.refresh()
 
+    def on_undo_delete(self):
+        if not self._deleted_ids:
+            return
+        tid = self._deleted_ids.pop()
+        self.undo_btn.setEnabled(bool(self._deleted_ids))
+        try:
+            restored = self.store.restore_task(tid)
+        except Exception:
+            restored = False
+        if not restored:
+            # 已被维护任务永久清除（或在其他设备上改动），无法恢复
+            QMessageBox.warning(self, self._tr("undo_delete"), self._tr("not_found"))
+        self.refresh()
+
     def _on_selection_changed(self):
         # 当表格当前选择发生变化时，启用或禁用编辑/删除按钮
         try:
@@ -343,9 +587,17 @@ class MainWindow(QMainWindow):
                 self.add_btn.setText(self._tr("add"))
                 self.edit_btn.setText(self._tr("edit"))
                 self.del_btn.setText(self._tr("delete"))
+                self.undo_btn.setText(self._tr("undo_delete"))
+                self.undo_btn.setToolTip(self._tr("undo_tooltip"))
                 self.pin_btn.setToolTip(self._tr("pin_tooltip"))
                 self.font_spin.setToolTip(self._tr("font_tooltip"))
                 self.lang_btn.setText(self._tr("lang_btn"))
+                for key, btn in self.filter_btns.items():
+                    btn.setText(self._tr(f"filter_{key}"))
+                self.workspace_combo.setToolTip(self._tr("workspace_tooltip"))
+                self.new_ws_btn.setToolTip(self._tr("new_workspace"))
+                self.match_all_check.setText(self._tr("match_all"))
+                self.match_all_check.setToolTip(self._tr("match_all_tooltip"))
                 # refresh status and table
                 self.refresh()
             except Exception:
@@ -440,6 +692,28 @@ class MainWindow(QMainWindow):
             except Exception:
                 pass
 
+    def _on_reminder_due(self, task_id: int, title: str):
+        """任务到达截止时间时显示托盘通知；没有系统托盘时让窗口在任务栏中闪烁提示。"""
+        try:
+            if self.tray is not None:
+                self.tray.showMessage(self._tr("reminder_title"), title, QSystemTrayIcon.Information)
+            else:
+                QApplication.alert(self)
+        except Exception:
+            pass
+
+    def closeEvent(self, event):
+        try:
+            self.reminders.stop()
+        except Exception:
+            pass
+        self.title_index.detach()
+        try:
+            self.store.close()
+        except Exception:
+            pass
+        super().closeEvent(event)
+
     def _toggle_always_on_top(self, checked: bool):
         try:
             if checked:
@@ -553,19 +827,25 @@ class MainWindow(QMainWindow):
 
             # 为每一行计算所需高度以容纳换行文本（使用 title_fm 来测度标题列）
             default_h = max(fm.height(), title_fm.height()) + 10
+            # 大多数行只需默认高度：通过表头默认高度统一设置，只对高度不同的行单独调用 setRowHeight
+            try:
+                self.table.verticalHeader().setDefaultSectionSize(default_h)
+            except Exception:
+                pass
             for r in range(self.model.rowCount()):
                 try:
                     row = self.model._rows[r]
                     text = (row.get("title") or "")
                     # 计算文字在 title_w 宽度下需要的高度，使用标题字体的度量和换行
                     br = title_fm.boundingRect(0, 0, title_w, 10000, Qt.TextWordWrap, text)
-                    needed = br.height() + 12
-                    self.table.setRowHeight(r, max(default_h, needed))
+                    needed = max(default_h, br.height() + 12)
                 except Exception:
-                    try:
-                        self.table.setRowHeight(r, default_h)
-                    except Exception:
-                        pass
+                    needed = default_h
+                try:
+                    if self.table.rowHeight(r) != needed:
+                        self.table.setRowHeight(r, needed)
+                except Exception:
+                    pass
         except Exception:
             pass
 
@@ -1,4 +1,4 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 from PySide6.QtCore import QAbstractTableModel, Qt, QModelIndex
 from PySide6.QtGui import QFont
 
@@ -20,11 +20,14 @@ class TaskTableModel(QAbstractTableModel):
         },
     }
 
-    def __init__(self, rows: Optional[List[Dict[str, Any]]] = None, title_font: Optional[QFont] = None, parent=None):
+    def __init__(self, rows: Optional[List[Dict[str, Any]]] = None, title_font: Optional[QFont] = None, parent=None,
+                 notes_loader: Optional[Callable[[int], Optional[str]]] = None):
         super().__init__(parent)
         self._rows = rows or []
         self._title_font = title_font or QFont()
         self._lang = "zh"
+        # rows only carry a `has_notes` flag; the notes text is fetched by id when a tooltip needs it
+        self._notes_loader = notes_loader
 
     def rowCount(self, parent=QModelIndex()):
         return len(self._rows)
@@ -53,8 +56,12 @@ class TaskTableModel(QAbstractTableModel):
             if c in (1, 2, 3):
                 return Qt.AlignCenter
         if role == Qt.ToolTipRole:
-            notes = row.get("notes")
-            return notes or None
+            if not row.get("has_notes") or self._notes_loader is None:
+                return None
+            try:
+                return self._notes_loader(row.get("id")) or None
+            except Exception:
+                return None
         if role == Qt.FontRole and c == 0:
             return self._title_font
         return None
@@ -93,6 +100,12 @@ class TaskTableModel(QAbstractTableModel):
             return self._rows[row].get("id")
         return None
 
+    def is_done(self, row: int):
+        """Done flag of the row as displayed (None if there is no such row)."""
+        if 0 <= row < len(self._rows):
+            return bool(self._rows[row].get("done"))
+        return None
+
     def set_title_font(self, font: QFont):
         self._title_font = font
         # notify view that column 0 data (font) changed
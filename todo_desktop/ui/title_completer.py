@@ -0,0 +1,69 @@
+from typing import List
+
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt
+from PySide6.QtWidgets import QCompleter, QLineEdit
+
+from ..title_index import TitleIndex
+
+
+class TitleCompletionModel(QAbstractListModel):
+    """Holds only the current suggestions; ranking and prefix matching happen in TitleIndex."""
+
+    def __init__(self, index: TitleIndex, limit: int = 10, parent=None):
+        super().__init__(parent)
+        self._index = index
+        self._limit = limit
+        self._items: List[str] = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._items)
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return self._items[index.row()]
+        return None
+
+    def set_prefix(self, prefix: str):
+        items = self._index.suggest(prefix, self._limit)
+        if items != self._items:
+            self.beginResetModel()
+            self._items = list(items)
+            self.endResetModel()
+
+
+class TitleCompleter(QCompleter):
+    """Completion popup for a title QLineEdit.
+
+    QCompleter's own filtering would scan every row of the model on each key
+    press, so it runs in UnfilteredPopupCompletion mode over a model that
+    already contains just the ranked matches for the current text.
+    """
+
+    def __init__(self, line_edit: QLineEdit, index: TitleIndex, limit: int = 10):
+        super().__init__(line_edit)
+        self.title_model = TitleCompletionModel(index, limit, self)
+        self.setModel(self.title_model)
+        self.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.setCaseSensitivity(Qt.CaseInsensitive)
+        # attached with setWidget rather than QLineEdit.setCompleter, so the line edit does not
+        # run QCompleter's built-in prefix filtering on every edit
+        self.setWidget(line_edit)
+        self._line_edit = line_edit
+        line_edit.textEdited.connect(self._on_text_edited)
+        self.activated[str].connect(self._on_activated)
+
+    def _on_text_edited(self, text: str):
+        try:
+            self.title_model.set_prefix(text)
+        except Exception:
+            return
+        popup = self.popup()
+        if self.title_model.rowCount() and text.strip():
+            self.complete()
+        elif popup.isVisible():
+            popup.hide()
+
+    def _on_activated(self, text: str):
+        self._line_edit.setText(text)
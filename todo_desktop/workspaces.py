@@ -0,0 +1,109 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from . import repository
+from .models import create_db_engine, make_sessionmaker
+
+DEFAULT_WORKSPACE = "default"
+_NAME_RE = re.compile(r"[\w\- ]+")
+
+
+class Workspace:
+    """One task list: its own SQLite file, engine, sessionmaker and repository caches."""
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.engine = create_db_engine(path)
+        self.state = repository.RepositoryState(make_sessionmaker(self.engine))
+        self.last_used = time.monotonic()
+
+    def close(self):
+        self.engine.dispose()
+
+
+class WorkspacePool:
+    """Opens workspaces on demand and keeps the most recently used ones open.
+
+    At most `capacity` workspaces stay open, and ones unused for `max_idle`
+    seconds are closed on the next lookup. Recently used workspaces therefore
+    switch without reconnecting or reloading their cached lists. The active
+    workspace is never closed.
+    """
+
+    def __init__(self, root_dir: str, capacity: int = 4, max_idle: float = 15 * 60, default_path: Optional[str] = None):
+        self.root_dir = root_dir
+        self.capacity = max(1, capacity)
+        self.max_idle = max_idle
+        self.default_path = default_path or os.path.join(root_dir, "todo_desktop.db")
+        self.active: Optional[Workspace] = None
+        self._open: "OrderedDict[str, Workspace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def workspace_dir(self) -> str:
+        return os.path.join(self.root_dir, "workspaces")
+
+    def path_for(self, name: str) -> str:
+        if name == DEFAULT_WORKSPACE:
+            return self.default_path
+        if not _NAME_RE.fullmatch(name or ""):
+            raise ValueError(f"invalid workspace name: {name!r}")
+        return os.path.join(self.workspace_dir, f"{name}.db")
+
+    def names(self) -> List[str]:
+        """The default workspace followed by the other existing workspaces, sorted."""
+        names = set(self._open)
+        if os.path.isdir(self.workspace_dir):
+            names.update(f[:-3] for f in os.listdir(self.workspace_dir) if f.endswith(".db"))
+        names.discard(DEFAULT_WORKSPACE)
+        return [DEFAULT_WORKSPACE] + sorted(names)
+
+    def is_open(self, name: str) -> bool:
+        return name in self._open
+
+    def get(self, name: str) -> Workspace:
+        """Return the workspace `name`, opening (and creating) it if needed."""
+        with self._lock:
+            ws = self._open.get(name)
+            if ws is None:
+                path = self.path_for(name)
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                ws = Workspace(name, path)
+                self._open[name] = ws
+            else:
+                self._open.move_to_end(name)
+            ws.last_used = time.monotonic()
+            self._evict()
+            return ws
+
+    def activate(self, name: str) -> Workspace:
+        """Make `name` the workspace used by the repository functions."""
+        ws = self.get(name)
+        repository.activate(ws.state)
+        self.active = ws
+        with self._lock:
+            # the previously active workspace may now be closed if it is over capacity or idle
+            self._evict()
+        return ws
+
+    def close_all(self):
+        with self._lock:
+            for ws in self._open.values():
+                ws.close()
+            self._open.clear()
+            self.active = None
+
+    def _evict(self):
+        now = time.monotonic()
+        for name, ws in list(self._open.items()):
+            if len(self._open) <= self.capacity and now - ws.last_used <= self.max_idle:
+                continue
+            if ws is self.active or name == next(reversed(self._open)):
+                continue
+            del self._open[name]
+            ws.close()